@@ -58,6 +58,8 @@ from .oaisetmask import OaiSetMask
 from .oaisetselect import OaiSetSelect # deprecated
 from .fields2oairecord import Fields2OaiRecord
 from .oaijazz import OaiJazz, allHierarchicalSetSpecs
+from .timebucketedoaijazz import TimeBucketedOaiJazz
+from .shardedoaijazz import ShardedOaiJazz
 from .oaiaddrecord import OaiAddRecord, OaiAddDeleteRecordWithPrefixesAndSetSpecs
 from .oaibranding import OaiBranding
 from .suspendregister import SuspendRegister
@@ -0,0 +1,225 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from collections import OrderedDict
+from zlib import compressobj, DEFLATED, MAX_WBITS, Z_SYNC_FLUSH
+
+from weightless.core import compose
+
+try:
+    from zstandard import ZstdCompressor, COMPRESSOBJ_FLUSH_BLOCK
+except ImportError:
+    ZstdCompressor = None
+
+
+DEFAULT_COMPRESSION_LEVEL = 6
+DEFAULT_MINIMUM_SIZE = 1024
+SUPPORTED_ENCODINGS = (['zstd'] if ZstdCompressor is not None else []) + ['gzip', 'deflate']
+
+
+def acceptedEncoding(headers, encodings=None):
+    """The first of encodings (in order of preference) allowed by the Accept-Encoding header."""
+    encodings = SUPPORTED_ENCODINGS if encodings is None else encodings
+    acceptEncoding = ''
+    for name, value in (headers or {}).items():
+        if name.lower() == 'accept-encoding':
+            acceptEncoding = value
+    qualities = {}
+    for part in acceptEncoding.split(','):
+        coding, _, parameters = part.partition(';')
+        quality = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith('q='):
+            try:
+                quality = float(parameters[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    for encoding in encodings:
+        if qualities.get(encoding, qualities.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class Compressor(object):
+    def __init__(self, encoding, level=DEFAULT_COMPRESSION_LEVEL):
+        self.encoding = encoding
+        if encoding == 'zstd':
+            self._compressobj = ZstdCompressor(level=level).compressobj()
+            self._syncFlushMode = COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._compressobj = compressobj(level, DEFLATED, MAX_WBITS | 16 if encoding == 'gzip' else MAX_WBITS)
+            self._syncFlushMode = Z_SYNC_FLUSH
+
+    def compress(self, data):
+        return self._compressobj.compress(data)
+
+    def syncFlush(self):
+        return self._compressobj.flush(self._syncFlushMode)
+
+    def flush(self):
+        return self._compressobj.flush()
+
+
+class GzipMember(str):
+    """Text that also carries its own complete gzip member.
+
+    A gzip compressed response ends its current member and includes this one
+    as is; any other consumer just sees the text.
+    """
+    def __new__(cls, text, level=DEFAULT_COMPRESSION_LEVEL):
+        member = str.__new__(cls, text)
+        compressor = compressobj(level, DEFLATED, MAX_WBITS | 16)
+        member.compressed = compressor.compress(text.encode()) + compressor.flush()
+        return member
+
+    def size(self):
+        return len(self) + len(self.compressed)
+
+
+class GzipMemberCache(object):
+    """Least recently used GzipMembers up to a total size of maxBytes."""
+    def __init__(self, maxBytes, level=DEFAULT_COMPRESSION_LEVEL):
+        self._maxBytes = maxBytes
+        self._level = level
+        self._members = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        member = self._members.pop(key, None)
+        if member is not None:
+            self._members[key] = member
+        return member
+
+    def add(self, key, text):
+        member = GzipMember(text, level=self._level)
+        if member.size() > self._maxBytes:
+            return member
+        previous = self._members.pop(key, None)
+        if previous is not None:
+            self._size -= previous.size()
+        while self._members and self._size + member.size() > self._maxBytes:
+            _, evicted = self._members.popitem(last=False)
+            self._size -= evicted.size()
+        self._members[key] = member
+        self._size += member.size()
+        return member
+
+    def __len__(self):
+        return len(self._members)
+
+
+def compressResponse(response, encoding, level=DEFAULT_COMPRESSION_LEVEL, minimumSize=DEFAULT_MINIMUM_SIZE):
+    """Compresses the body of an HTTP response while it streams.
+
+    The body is buffered until it reaches minimumSize; smaller responses are
+    sent uncompressed. Anything that is not str or bytes, like a Yield or a
+    suspend callable, flushes the compressor so the client receives all data
+    produced so far, and is passed on. A GzipMember is included without
+    compressing it again when the encoding is gzip.
+    """
+    pending = []
+    header = None
+    body = []
+    bodySize = 0
+    compressor = None
+    passThrough = False
+    def startCompression():
+        compressor = Compressor(encoding, level=level)
+        return compressor, _compressedHeader(header, encoding) + compressor.compress(b''.join(body))
+
+    for data in compose(response):
+        if passThrough:
+            yield data
+            continue
+        if type(data) is GzipMember and encoding == 'gzip' and header is not None:
+            if compressor is None:
+                compressor, started = startCompression()
+                yield started
+            yield compressor.flush() + data.compressed
+            compressor = Compressor(encoding, level=level)
+            continue
+        if isinstance(data, str):
+            data = data.encode()
+        if type(data) is not bytes:
+            if header is None:
+                if pending:
+                    yield b''.join(pending)
+                    passThrough = True
+            else:
+                if compressor is None:
+                    compressor, started = startCompression()
+                    yield started
+                yield compressor.syncFlush()
+            yield data
+            continue
+        if header is None:
+            pending.append(data)
+            headerAndBody = b''.join(pending)
+            if not headerAndBody.startswith(b'HTTP/') and len(headerAndBody) >= 5:
+                yield headerAndBody
+                passThrough = True
+                continue
+            if CRLFCRLF not in headerAndBody:
+                continue
+            header, data = headerAndBody.split(CRLFCRLF, 1)
+            pending = []
+            if not _compressible(header):
+                yield header + CRLFCRLF + data
+                passThrough = True
+                continue
+        if compressor is None:
+            body.append(data)
+            bodySize += len(data)
+            if bodySize >= minimumSize:
+                compressor, started = startCompression()
+                yield started
+            continue
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    if passThrough:
+        return
+    if header is None:
+        if pending:
+            yield b''.join(pending)
+        return
+    if compressor is None:
+        yield header + CRLFCRLF + b''.join(body)
+        return
+    yield compressor.flush()
+
+def _compressible(header):
+    statusLine, _, fields = header.partition(CRLF)
+    status = statusLine.split()[1:2]
+    if status in ([b'204'], [b'304']):
+        return False
+    return not any(line.lower().startswith(b'content-encoding:') for line in fields.split(CRLF))
+
+def _compressedHeader(header, encoding):
+    return header + CRLF + b'Content-Encoding: ' + encoding.encode() + CRLF + b'Vary: Accept-Encoding' + CRLFCRLF
+
+CRLF = b'\r\n'
+CRLFCRLF = CRLF * 2
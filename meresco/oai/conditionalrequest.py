@@ -0,0 +1,96 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from email.utils import formatdate, parsedate_to_datetime
+from time import time
+
+from weightless.core import compose
+
+
+def entityTag(*values):
+    return 'W/"%s"' % '-'.join(str(value) for value in values)
+
+def httpDate(stamp):
+    """HTTP date for a stamp in microseconds"""
+    return formatdate(stamp / 1000000.0, usegmt=True)
+
+def isNotModified(headers, etag, lastModifiedStamp):
+    """If-None-Match decides on its own when present (RFC 7232, section 6)."""
+    ifNoneMatch = _header(headers, 'if-none-match')
+    if ifNoneMatch is not None:
+        tags = [_weak(tag.strip()) for tag in ifNoneMatch.split(',')]
+        return '*' in tags or _weak(etag) in tags
+    ifModifiedSince = _header(headers, 'if-modified-since')
+    if ifModifiedSince is not None:
+        try:
+            since = parsedate_to_datetime(ifModifiedSince).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return lastModifiedStamp < since * 1000000
+    return False
+
+def notModifiedResponse(etag, lastModifiedStamp):
+    return 'HTTP/1.0 304 Not Modified\r\n%s\r\n' % _validatorHeaders(etag, lastModifiedStamp)
+
+def addValidatorHeaders(response, etag, lastModifiedStamp):
+    """Adds ETag and Last-Modified to the header of a 200 OK response."""
+    response = compose(response)
+    pending = ''
+    for data in response:
+        if type(data) is not str:
+            yield pending
+            yield data
+            break
+        pending += data
+        if not pending.startswith('HTTP/1.0 200') and len(pending) >= len('HTTP/1.0 200'):
+            yield pending
+            break
+        if '\r\n\r\n' in pending:
+            header, body = pending.split('\r\n\r\n', 1)
+            yield '%s\r\n%s\r\n%s' % (header, _validatorHeaders(etag, lastModifiedStamp), body)
+            break
+    else:
+        yield pending
+        return
+    yield response
+
+def _validatorHeaders(etag, lastModifiedStamp):
+    """Last-Modified is rounded up to whole seconds and left out while that
+    second has not passed: a later change in the same second would not be
+    newer than it."""
+    headers = 'ETag: %s\r\n' % etag
+    lastModified = -(-lastModifiedStamp // 1000000)
+    if lastModified <= time():
+        headers += 'Last-Modified: %s\r\n' % httpDate(lastModified * 1000000)
+    return headers
+
+def _weak(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+def _header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value
+    return None
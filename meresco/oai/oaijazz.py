@@ -37,53 +37,90 @@
 #
 ## end license ##
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from gzip import GzipFile
 from os.path import isdir, join, isfile
 from os import makedirs, listdir, rename
+from io import TextIOWrapper
+from itertools import islice
+from time import time
 from warnings import warn
 
-from json import load, dump, dumps, loads
+from json import load, dump, dumps, loads, JSONEncoder
 from meresco.core import Observable
 from meresco.oaicommon import timeToNumber, stamp2zulutime, timestamp, Partition
 
 try:
     from java.lang import Long
     from java.nio.file import Paths
+    from java.util import ArrayList
+    from java.util.concurrent import Executors
     from org.apache.lucene.document import Document, StringField, Field, StoredField, LongPoint, IntPoint
-    from org.apache.lucene.search import IndexSearcher, TermQuery, BooleanQuery, MatchAllDocsQuery
+    from org.apache.lucene.search import IndexSearcher, TermQuery, BooleanQuery, MatchAllDocsQuery, TermInSetQuery
     from org.apache.lucene.search import BooleanClause, TotalHitCountCollector, Sort, SortField
-    from org.apache.lucene.index import DirectoryReader, Term, IndexWriter, IndexWriterConfig
+    from org.apache.lucene.search import SearcherManager, ControlledRealTimeReopenThread
+    from org.apache.lucene.index import DirectoryReader, Term, IndexWriter, IndexWriterConfig, MultiBits, SegmentInfos
+    from org.apache.lucene.index import ConcurrentMergeScheduler, LogByteSizeMergePolicy
     from org.apache.lucene.store import FSDirectory
-    from org.apache.lucene.document import NumericDocValuesField
+    from org.apache.lucene.document import NumericDocValuesField, SortedSetDocValuesField, BinaryDocValuesField
     from org.apache.lucene.util import BytesRef, Version
-    from lucene import JArray
+    from lucene import JArray, getVMEnv
     from org.apache.lucene.analysis.core import WhitespaceAnalyzer
-    from org.meresco.oai import OaiSortingCollector
+    from org.meresco.oai import OaiSortingCollector, OaiSortingCollectorManager, OaiHeaders, StampRangeQuery, TermBitSets, SegmentWarmer, OaiSearcherFactory, IdentifierStamps
 except ImportError:
     raise ImportError("initVM() not called: please add to your project: 'from lucene import initVM; initVM(); from meresco_oai import initVM; initVM()'")
 
 
 DEFAULT_BATCH_SIZE = 200
+DEFAULT_UPDATE_BATCH_SIZE = 1000
+DEFAULT_EXPORT_BATCH_SIZE = 10000
+DEFAULT_EXPORT_THREADS = 2
+DEFAULT_IMPORT_BATCH_SIZE = 10000
 
 class OaiJazz(Observable):
-    version = '12'
+    version = '13'
 
     def __init__(self, aDirectory, alwaysDeleteInPrefixes=None, persistentDelete=True, name=None, **kwargs):
         Observable.__init__(self, name=name)
         self._directory = aDirectory
         if not isdir(aDirectory):
             makedirs(aDirectory)
-        self._versionFormatCheck()
+        versionInFile = self._versionFormatCheck()
         self._deletePrefixes = set(alwaysDeleteInPrefixes or [])
         self._persistentDelete = persistentDelete
         self._load()
-        self._writer, self._reader, self._searcher = getLucene(aDirectory)
+        searchThreads = kwargs.get('searchThreads')
+        self._searchExecutor = Executors.newFixedThreadPool(searchThreads) if searchThreads else None
+        self._writer, self._searcherManager = self._openIndex(warmSegments=kwargs.get('warmSegments', True), tuningProfile=kwargs.get('tuningProfile'), searchExecutor=self._searchExecutor)
+        self._searcher = None
+        self._acquireLatestSearcher()
         self._latestModifications = set()
+        self._pendingDocuments = {}
+        self._pendingGenerations = {}
+        self._reopenThread = None
+        maxSearcherStaleness = kwargs.get('maxSearcherStaleness')
+        if maxSearcherStaleness is not None:
+            self._reopenThread = ControlledRealTimeReopenThread(self._writer, self._searcherManager, float(maxSearcherStaleness), 0.0)
+            self._reopenThread.setDaemon(True)
+            self._reopenThread.start()
+        self._maxPendingDocuments = kwargs.get('maxPendingDocuments', _MAX_MODIFICATIONS)
+        self._reopenInterval = kwargs.get('reopenInterval')
+        self._lastReopen = time()
+        upgraded = versionInFile == '12'
+        if upgraded:
+            self._upgradeFromVersion12()
+        self._writeVersion()
         self._newestStamp = self._newestStampFromIndex()
+        self._counters = None if upgraded else self._loadCounters()
+        if self._counters is None:
+            self._rebuildCounters()
         self._deleteInSetsSupport = False
         if kwargs.get('deleteInSets'):
             # Supporting deleting in sets is not OAI-PMH compatible
             self._deleteInSetsSupport = True
         self._importMode = kwargs.get('importMode', False) # import mode when reading an export
+        self._identifierStamps = IdentifierStamps.fromReader(self._reader) if kwargs.get('identifierStamps') else None
 
     _sets = property(lambda self: self._data["sets"])
     _prefixes = property(lambda self: self._data["prefixes"])
@@ -100,25 +137,43 @@ class OaiJazz(Observable):
             shouldCountHits=False):
         batchSize = DEFAULT_BATCH_SIZE if batchSize is None else batchSize
         searcher = self._getSearcher()
+        countRemaining = shouldCountHits and partition is None and not setsMask and len(sets or []) <= 1
         queryBuilder = self._luceneQueryBuilder(prefix=prefix, sets=sets, setsMask=setsMask, partition=partition)
-        collector = self._search(queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize, shouldCountHits)
-        return self._OaiSelectResult(docs=collector.docs(searcher),
-                collector=collector,
-                parent=self,
+        collector = self._search(searcher, queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize, shouldCountHits and not countRemaining, prefix=prefix)
+        records = _headerRecords(collector.headers(searcher),
                 requestedSets=sets if self._deleteInSetsSupport else None,
                 requestedPrefix=prefix,
             )
-
-    def _search(self, query, continueAfter, oaiFrom, oaiUntil, batchSize, shouldCountHits):
-        searcher = self._getSearcher()
-
-        start = max(int(continueAfter or '0') + 1, self._fromTime(oaiFrom))
-        stop = self._untilTime(oaiUntil) or Long.MAX_VALUE
-
+        result = self._OaiSelectResult(records=records, collector=collector, parent=self)
+        if countRemaining:
+            result.recordsRemaining = 0
+            if result.moreRecordsAvailable:
+                result.recordsRemaining = self._countRecords(searcher, prefix=prefix, setSpec=next(iter(sets)) if sets else None, continueAfter=result.continueAfter, oaiFrom=oaiFrom, oaiUntil=oaiUntil)['total']
+        return result
+
+    def _search(self, searcher, query, continueAfter, oaiFrom, oaiUntil, batchSize, shouldCountHits, prefix=None):
+        start, stop = self._stampRange(continueAfter, oaiFrom, oaiUntil)
+        if start > 1 or stop != Long.MAX_VALUE:
+            query = BooleanQuery.Builder() \
+                .add(query, BooleanClause.Occur.MUST) \
+                .add(StampRangeQuery(int(start), int(stop)), BooleanClause.Occur.FILTER) \
+                .build()
+        if self._searchExecutor is not None:
+            collectorManager = OaiSortingCollectorManager(batchSize, shouldCountHits, int(start), int(stop))
+            if prefix:
+                collectorManager.setPrefix(prefix)
+            return OaiSortingCollector.cast_(searcher.search(query, collectorManager))
         collector = OaiSortingCollector(batchSize, shouldCountHits, int(start), int(stop))
+        if prefix:
+            collector.setPrefix(prefix)
         searcher.search(query, collector)
         return collector
 
+    def _stampRange(self, continueAfter, oaiFrom, oaiUntil):
+        start = max(int(continueAfter or '0') + 1, self._fromTime(oaiFrom))
+        stop = self._untilTime(oaiUntil) or Long.MAX_VALUE
+        return start, stop
+
     def _luceneQueryBuilder(self, prefix, sets=None, setsMask=None, partition=None):
         numberOfClausesAdded = 0
         queryBuilder = BooleanQuery.Builder()
@@ -152,23 +207,18 @@ class OaiJazz(Observable):
         return queryBuilder
 
     class _OaiSelectResult(object):
-        def __init__(inner, docs, collector, parent, requestedSets, requestedPrefix):
-            inner.docs = docs
+        def __init__(inner, records, collector, parent):
             inner.moreRecordsAvailable = collector.moreRecordsAvailable
             recordsRemaining = collector.remainingRecords()
             if recordsRemaining != -1:
                 inner.recordsRemaining = recordsRemaining
             inner.parent = parent
-            inner.records = inner._records(requestedSets=requestedSets, requestedPrefix=requestedPrefix)
-            inner.numberOfRecordsInBatch = len(docs)
-            inner.continueAfter = None if len(docs) == 0 else inner._record(docs[-1]).stamp
+            inner.records = inner._records(records)
+            inner.numberOfRecordsInBatch = len(records)
+            inner.continueAfter = None if len(records) == 0 else records[-1].stamp
 
-        def _record(inner, doc, **kwargs):
-            return Record(doc, **kwargs)
-
-        def _records(inner, **recordKwargs):
-            for doc in inner.docs:
-                record = inner._record(doc, **recordKwargs)
+        def _records(inner, records):
+            for record in records:
                 if record.identifier not in inner.parent._latestModifications:
                     yield record
 
@@ -179,6 +229,28 @@ class OaiJazz(Observable):
             raise ValueError('No metadataPrefix specified for record with identifier "%s"' % identifier)
         self._updateOaiRecord(identifier=identifier, metadataPrefixes=metadataPrefixes, setSpecs=setSpecs)
 
+    def addOaiRecords(self, records, batchSize=DEFAULT_UPDATE_BATCH_SIZE):
+        "Bulk variant of addOaiRecord; records is an iterable of dicts with the keyword arguments of addOaiRecord."
+        def updates():
+            for record in records:
+                identifier = record.get('identifier')
+                metadataPrefixes = record.get('metadataPrefixes')
+                if not identifier:
+                    raise ValueError("Empty identifier not allowed.")
+                if not metadataPrefixes:
+                    raise ValueError('No metadataPrefix specified for record with identifier "%s"' % identifier)
+                yield dict(identifier=identifier, metadataPrefixes=metadataPrefixes, setSpecs=record.get('setSpecs'))
+        self._updateOaiRecords(updates(), batchSize=batchSize)
+
+    def deleteOaiRecords(self, identifiers, batchSize=DEFAULT_UPDATE_BATCH_SIZE):
+        "Bulk variant of deleteOaiRecord."
+        def updates():
+            for identifier in identifiers:
+                if not identifier:
+                    raise ValueError("Empty identifier not allowed.")
+                yield dict(identifier=identifier, metadataPrefixes=self._deletePrefixes, setSpecs=None, delete=True)
+        self._updateOaiRecords(updates(), batchSize=batchSize)
+
     def delete(self, identifier):
         self.deleteOaiRecord(identifier=identifier)
         return
@@ -190,9 +262,7 @@ class OaiJazz(Observable):
             raise ValueError("Empty identifier not allowed.")
         metadataPrefixes = self._deletePrefixes.union(metadataPrefixes or [])
         oldDoc = self._getDocument(identifier)
-        if oldDoc is None and not metadataPrefixes:
-            if setSpecs:
-                raise ValueError('setSpec not allowed for unknown record if no metadataPrefixes are provided')
+        if self._isDeleteOfUnknownRecord(oldDoc=oldDoc, metadataPrefixes=metadataPrefixes, setSpecs=setSpecs):
             return
         self._updateOaiRecord(identifier=identifier, setSpecs=setSpecs, metadataPrefixes=metadataPrefixes, delete=True, oldDoc=oldDoc)
 
@@ -216,15 +286,20 @@ class OaiJazz(Observable):
     def purge(self, identifier, ignorePeristentDelete=False):
         if self._persistentDelete and not ignorePeristentDelete:
             raise KeyError("Purging of records is not allowed with persistent deletes.")
-        self._latestModifications.add(str(identifier))
-        return self._purge(identifier)
+        self._updateCounters(self._getDocument(identifier), -1)
+        self._purge(identifier)
+        self._addPendingDocument(identifier, None)
+        self._newGeneration()
+        self._maybeReopen()
 
     def purgeFromSet(self, setSpec, ignorePeristentDelete=False):
         if self._persistentDelete and not ignorePeristentDelete:
             raise KeyError("Purging of a set is not allowed with persistent deletes.")
-        self._latestModifications.update([setSpec] * (_MAX_MODIFICATIONS + 1))
         self._sets.pop(setSpec, None)
-        return self._purgeFromSet(setSpec)
+        self._purgeFromSet(setSpec)
+        self._newGeneration()
+        self._reopen()
+        self._rebuildCounters()
 
     def overrideRecord(self, identifier, metadataPrefixes, setSpecs, ignoreOaiSpec=False):
         if not ignoreOaiSpec:
@@ -234,6 +309,8 @@ class OaiJazz(Observable):
         self._updateOaiRecord(identifier=identifier, metadataPrefixes=metadataPrefixes, setSpecs=setSpecs, delete=deleted)
 
     def updateMetadataFormat(self, prefix, schema, namespace):
+        if list(self._prefixes.get(prefix, [])) != [schema, namespace]:
+            self._newGeneration()
         self._prefixes[prefix] = (schema, namespace)
 
     def getAllMetadataFormats(self):
@@ -247,6 +324,8 @@ class OaiJazz(Observable):
         return prefix in self._prefixes
 
     def updateSet(self, setSpec, setName):
+        if self._sets.get(setSpec) != setName:
+            self._newGeneration()
         self._sets[setSpec] = setName
 
     def getAllSets(self, includeSetNames=False):
@@ -255,14 +334,39 @@ class OaiJazz(Observable):
         return set(self._sets.keys())
 
     def getNrOfRecords(self, prefix='oai_dc', setSpec=None, continueAfter=None, oaiFrom=None, oaiUntil=None, partition=None):
+        if partition is None and not (continueAfter or oaiFrom or oaiUntil) and not (prefix and setSpec):
+            if prefix:
+                counter = self._counters['prefixes'].get(prefix)
+            elif setSpec:
+                counter = self._counters['sets'].get(setSpec)
+            else:
+                counter = self._counters['all']
+            return dict(counter or {'total': 0, 'deletes': 0})
+        if partition is None:
+            return self._countRecords(self._getSearcher(), prefix=prefix, setSpec=setSpec, continueAfter=continueAfter, oaiFrom=oaiFrom, oaiUntil=oaiUntil)
         queryBuilder = self._luceneQueryBuilder(prefix=prefix, sets=[setSpec] if setSpec else None, partition=partition)
-        collector = self._search(queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize=1, shouldCountHits=True)
+        searcher = self._getSearcher()
+        collector = self._search(searcher, queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize=1, shouldCountHits=True, prefix=prefix)
 
         queryBuilder.add(TermQuery(Term(TOMBSTONE_FIELD, TOMBSTONE_VALUE)), BooleanClause.Occur.MUST)
 
-        deleteCollector = self._search(queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize=1, shouldCountHits=True)
+        deleteCollector = self._search(searcher, queryBuilder.build(), continueAfter, oaiFrom, oaiUntil, batchSize=1, shouldCountHits=True, prefix=prefix)
         return {"total": collector.totalHits(), "deletes": deleteCollector.totalHits()}
 
+    def _countRecords(self, searcher, prefix, setSpec, continueAfter, oaiFrom, oaiUntil):
+        reader = searcher.getIndexReader()
+        start, stop = self._stampRange(continueAfter, oaiFrom, oaiUntil)
+        terms = []
+        if prefix:
+            terms.append((PREFIX_FIELD, prefix))
+        if setSpec:
+            terms.append((SETS_FIELD, setSpec))
+        def count(terms):
+            if self._searchExecutor is not None:
+                return TermBitSets.count(reader, [field for field, _ in terms], [value for _, value in terms], int(start), int(stop), self._searchExecutor)
+            return TermBitSets.count(reader, [field for field, _ in terms], [value for _, value in terms], int(start), int(stop))
+        return {"total": count(terms), "deletes": count(terms + [(TOMBSTONE_FIELD, TOMBSTONE_VALUE)])}
+
     def getRecord(self, identifier, metadataPrefix=None):
         doc = self._getDocument(identifier)
         if doc is None:
@@ -272,6 +376,10 @@ class OaiJazz(Observable):
     def getDeletedRecordType(self):
         return "persistent" if self._persistentDelete else "transient"
 
+    def getGeneration(self):
+        """time in microseconds of the last change not visible in the stamps: sets, metadata formats and purges"""
+        return self._data.get('generation', 0)
+
     def getLastStampId(self, prefix='oai_dc', setSpec=None):
         searcher = self._getSearcher()
         sort = Sort(SortField(NUMERIC_STAMP_FIELD, SortField.Type.LONG, True))
@@ -290,6 +398,7 @@ class OaiJazz(Observable):
     def commit(self):
         self._save()
         self._writer.commit()
+        self._saveCounters()
 
     def handleShutdown(self):
         print('handle shutdown: saving OaiJazz %s' % self._directory)
@@ -298,52 +407,115 @@ class OaiJazz(Observable):
 
     def close(self):
         self._save()
+        self._writer.commit()
+        self._saveCounters()
+        if self._reopenThread is not None:
+            self._reopenThread.close()
+        self._searcherManager.release(self._searcher)
+        self._searcherManager.close()
         self._writer.close()
+        if self._searchExecutor is not None:
+            self._searchExecutor.shutdown()
 
-    def export(self, outputfile):
+    def export(self, outputfile, batchSize=DEFAULT_EXPORT_BATCH_SIZE, exportThreads=DEFAULT_EXPORT_THREADS, compress=None, progress=None):
+        """Writes all records in stamp order. Batches are serialised by exportThreads while the next batch is selected; the file is gzipped if compress (default: outputfile ends with .gz). progress is called with the number of records written so far."""
         meta = dict(export_version=1, sets={}, metadataPrefixes={})
         for setSpec, setName in self.getAllSets(includeSetNames=True):
             meta['sets'][setSpec] = {'setName': setName}
         for prefix, schema, namespace in self.getAllMetadataFormats():
             meta['metadataPrefixes'][prefix]={'schema':schema, 'namespace': namespace}
-        with open(outputfile, 'w') as f:
-            f.write('META:\n')
-            f.write(dumps(meta, sort_keys=True))
-            f.write('\nRECORDS:\n')
-            result = self.oaiSelect(prefix=None)
-            while result.continueAfter:
-                for r in result.records:
-                    f.write(dumps(r.asExportDict(), sort_keys=True))
-                    f.write('\n')
-                result = self.oaiSelect(prefix=None, continueAfter=result.continueAfter)
+        compress = outputfile.endswith('.gz') if compress is None else compress
+        with _openExportFile(outputfile, compress) as f, ThreadPoolExecutor(max_workers=exportThreads) as executor:
+            f.write(('META:\n%s\nRECORDS:\n' % dumps(meta, sort_keys=True)).encode())
+            pending = deque()
+            exported = 0
+            batches = self._exportBatches(batchSize)
+            while True:
+                records = next(batches, None)
+                if records is not None:
+                    pending.append((len(records), executor.submit(_exportLines, records)))
+                    if len(pending) <= exportThreads:
+                        continue
+                if not pending:
+                    break
+                count, lines = pending.popleft()
+                f.write(lines.result())
+                exported += count
+                if progress is not None:
+                    progress(exported)
+
+    def _exportBatches(self, batchSize):
+        result = self.oaiSelect(prefix=None, batchSize=batchSize)
+        while result.continueAfter:
+            yield list(result.records)
+            if not result.moreRecordsAvailable:
+                break
+            result = self.oaiSelect(prefix=None, batchSize=batchSize, continueAfter=result.continueAfter)
 
     @classmethod
-    def importDump(cls, directory, dumpfile):
+    def importDump(cls, directory, dumpfile, batchSize=DEFAULT_IMPORT_BATCH_SIZE, importThreads=None, progress=None):
+        """Loads a dump written by export into an empty index. Records are added in batches without lookups, reopens or signals; with importThreads batches are added concurrently so Lucene builds their segments in parallel. progress is called with the number of records read so far."""
         jazz = cls(directory, deleteInSets=True, importMode=True)
-        with open(dumpfile) as d:
-            assert 'META:\n' == next(d)
-            meta = loads(next(d).strip())
-            assert meta['export_version'] == 1
-            for setSpec, setDict in list(meta.get('sets', {}).items()):
-                jazz.updateSet(setSpec=setSpec, setName=setDict.get('setName', ''))
-            for prefix, metadataDict in list(meta.get('metadataPrefixes', {}).items()):
-                jazz.updateMetadataFormat(prefix, schema=metadataDict.get('schema', ''), namespace=metadataDict.get('namespace', ''))
-            assert 'RECORDS:\n' == next(d)
-            for record in d:
-                record = loads(record.strip())
-                jazz._updateOaiRecord(
-                        identifier=record['identifier'],
-                        setSpecs=record['sets'],
-                        metadataPrefixes=record['prefixes'],
-                        delete=record.get('tombstone', False),
-                        deleteInSets=record.get('deletedSets', []),
-                        deleteInPrefixes=record.get('deletedPrefixes', []),
-                        _overrideStamp=record['timestamp'])
+        if jazz._newestStamp:
+            jazz.close()
+            raise ValueError("Importing a dump requires an empty index, %s is not empty." % directory)
+        executor = ThreadPoolExecutor(max_workers=importThreads, initializer=_attachCurrentThread) if importThreads else None
+        try:
+            with _openDump(dumpfile) as d:
+                assert 'META:\n' == next(d)
+                meta = loads(next(d).strip())
+                assert meta['export_version'] == 1
+                for setSpec, setDict in list(meta.get('sets', {}).items()):
+                    jazz.updateSet(setSpec=setSpec, setName=setDict.get('setName', ''))
+                for prefix, metadataDict in list(meta.get('metadataPrefixes', {}).items()):
+                    jazz.updateMetadataFormat(prefix, schema=metadataDict.get('schema', ''), namespace=metadataDict.get('namespace', ''))
+                assert 'RECORDS:\n' == next(d)
+                pending = deque()
+                imported = 0
+                while True:
+                    batch = [jazz._importDocument(loads(record)) for record in islice(d, batchSize)]
+                    if not batch:
+                        break
+                    for writer, docs in jazz._importWriters(batch):
+                        if executor is None:
+                            writer.addDocuments(docs)
+                        else:
+                            pending.append(executor.submit(writer.addDocuments, docs))
+                    if executor is not None:
+                        while len(pending) > importThreads:
+                            pending.popleft().result()
+                    imported += len(batch)
+                    if progress is not None:
+                        progress(imported)
+                for future in pending:
+                    future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown()
             jazz.close()
-            jazz = None
-
         return True
 
+    def _importDocument(self, record):
+        stamp = record['timestamp']
+        self._newestStamp = max(self._newestStamp, stamp)
+        doc, _, _ = self._createDocument(
+                identifier=record['identifier'],
+                setSpecs=record['sets'],
+                metadataPrefixes=record['prefixes'],
+                newStamp=stamp,
+                delete=record.get('tombstone', False),
+                deleteInSets=record.get('deletedSets', []),
+                deleteInPrefixes=record.get('deletedPrefixes', []))
+        self._updateCounters(doc, 1)
+        return stamp, doc
+
+    def _importWriters(self, stampedDocs):
+        """(writer, documents) pairs that add stampedDocs, (stamp, document) tuples in stamp order"""
+        docs = ArrayList()
+        for _, doc in stampedDocs:
+            docs.add(doc)
+        return [(self._writer, docs)]
+
 
     def _versionFormatCheck(self):
         versionFile = join(self._directory, "oai.version")
@@ -352,10 +524,38 @@ class OaiJazz(Observable):
         if isfile(versionFile):
             with open(versionFile) as fp:
                 versionInFile = fp.read()
-        assert listdir(self._directory) == [] or isfile(versionFile) and versionInFile == self.version, msg
-        with open(versionFile, 'w') as f:
+        assert listdir(self._directory) == [] or isfile(versionFile) and versionInFile in [self.version, '12'], msg
+        return versionInFile
+
+    def _writeVersion(self):
+        with open(join(self._directory, "oai.version"), 'w') as f:
             f.write(self.version)
 
+    def _upgradeFromVersion12(self):
+        print('Upgrading OaiJazz %s from version 12 to %s' % (self._directory, self.version))
+        from sys import stdout; stdout.flush()
+        reader = DirectoryReader.open(self._writer)
+        try:
+            liveDocs = MultiBits.getLiveDocs(reader)
+            for docId in range(reader.maxDoc()):
+                if liveDocs is not None and not liveDocs.get(docId):
+                    continue
+                storedDoc = reader.document(docId)
+                identifier = storedDoc.get(IDENTIFIER_FIELD)
+                doc, oldDeletedSets, oldDeletedPrefixes = self._getNewDocument(identifier, oldDoc=storedDoc)
+                _addStamp(doc, _stampFromDocument(storedDoc))
+                for prefix in oldDeletedPrefixes:
+                    _addStringField(doc, PREFIX_DELETED_FIELD, prefix)
+                for setSpec in oldDeletedSets:
+                    _addStringField(doc, SETS_DELETED_FIELD, setSpec)
+                if storedDoc.getField(TOMBSTONE_FIELD) is not None:
+                    _addTombstone(doc)
+                self._writer.updateDocument(Term(IDENTIFIER_FIELD, identifier), doc)
+        finally:
+            reader.close()
+        self._writer.commit()
+        self._reopen()
+
     def _newestStampFromIndex(self):
         searcher = self._getSearcher()
         maxDoc = searcher.getIndexReader().maxDoc()
@@ -363,20 +563,62 @@ class OaiJazz(Observable):
             return 0
         return _stampFromDocument(searcher.doc(maxDoc - 1))
 
-    def _getSearcher(self, identifier=None):
-        modifications = len(self._latestModifications)
-        if modifications == 0:
-            return self._searcher
-        if identifier and str(identifier) not in self._latestModifications and modifications < _MAX_MODIFICATIONS:
-            return self._searcher
-        newreader = DirectoryReader.openIfChanged(self._reader, self._writer, True)
-        if newreader:
-            self._reader.close()
-            self._reader = newreader
-            self._searcher = IndexSearcher(newreader)
-        self._latestModifications.clear()
+    def _getSearcher(self):
+        if self._reopenThread is not None:
+            self._acquireRefreshedSearcher()
+        elif self._latestModifications:
+            self._reopen()
         return self._searcher
 
+    def _openIndex(self, **luceneOptions):
+        return getLucene(self._directory, **luceneOptions)
+
+    def _reopen(self):
+        self._refreshSearchers()
+        self._acquireLatestSearcher()
+        self._latestModifications.clear()
+        self._pendingDocuments.clear()
+        self._pendingGenerations.clear()
+        self._lastReopen = time()
+
+    def _acquireRefreshedSearcher(self):
+        """takes the searcher refreshed in the background; pending documents it contains are no longer pending"""
+        searchingGeneration = self._reopenThread.getSearchingGen()
+        if not self._acquireLatestSearcher():
+            return
+        for identifier, generation in list(self._pendingGenerations.items()):
+            if generation <= searchingGeneration:
+                del self._pendingGenerations[identifier]
+                self._pendingDocuments.pop(identifier, None)
+                self._latestModifications.discard(identifier)
+
+    def _refreshSearchers(self):
+        self._searcherManager.maybeRefreshBlocking()
+
+    def _acquireLatestSearcher(self):
+        searcher = self._searcherManager.acquire()
+        if self._searcher is not None:
+            if searcher.equals(self._searcher):
+                self._searcherManager.release(searcher)
+                return False
+            self._searcherManager.release(self._searcher)
+        self._searcher = searcher
+        self._reader = searcher.getIndexReader()
+        return True
+
+    def _maybeReopen(self):
+        if len(self._pendingDocuments) >= self._maxPendingDocuments or \
+                (self._reopenInterval is not None and time() - self._lastReopen >= self._reopenInterval):
+            self._reopen()
+
+    def _addPendingDocument(self, identifier, doc):
+        self._latestModifications.add(str(identifier))
+        self._pendingDocuments[str(identifier)] = doc
+        if self._identifierStamps is not None and doc is not None:
+            self._identifierStamps.put(str(identifier), _stampFromDocument(doc))
+        if self._reopenThread is not None:
+            self._pendingGenerations[str(identifier)] = self._writer.getMaxCompletedSequenceNumber()
+
     def _fromTime(self, oaiFrom):
         if not oaiFrom:
             return 0
@@ -390,37 +632,129 @@ class OaiJazz(Observable):
 
 
     def _getDocument(self, identifier):
+        try:
+            return self._pendingDocuments[str(identifier)]
+        except KeyError:
+            pass
         docId = self._getDocId(identifier)
-        return self._getSearcher(identifier).doc(docId) if docId is not None else None
+        return self._searcher.doc(docId) if docId is not None else None
+
+    def _getDocuments(self, identifiers):
+        docs = {}
+        terms = ArrayList()
+        for identifier in identifiers:
+            try:
+                doc = self._pendingDocuments[str(identifier)]
+            except KeyError:
+                docId = self._mappedDocId(identifier)
+                if docId is None:
+                    terms.add(BytesRef(identifier))
+                elif docId != IdentifierStamps.ABSENT:
+                    docs[identifier] = self._searcher.doc(docId)
+                continue
+            if doc is not None:
+                docs[identifier] = doc
+        if terms.isEmpty():
+            return docs
+        results = self._searcher.search(TermInSetQuery(IDENTIFIER_FIELD, terms), terms.size())
+        for scoreDoc in results.scoreDocs:
+            doc = self._searcher.doc(scoreDoc.doc)
+            docs[str(doc.get(IDENTIFIER_FIELD))] = doc
+        return docs
 
     def _getDocId(self, identifier):
-        searcher = self._getSearcher(identifier)
-        results = searcher.search(TermQuery(Term(IDENTIFIER_FIELD, identifier)), 1)
+        docId = self._mappedDocId(identifier)
+        if docId is not None:
+            return None if docId == IdentifierStamps.ABSENT else docId
+        results = self._searcher.search(TermQuery(Term(IDENTIFIER_FIELD, identifier)), 1)
         if results.totalHits.value == 0:
             return None
         return results.scoreDocs[0].doc
 
+    def _mappedDocId(self, identifier):
+        """docId or ABSENT according to the identifier stamps; None if a query has to decide"""
+        if self._identifierStamps is None:
+            return None
+        docId = self._identifierStamps.docId(self._reader, identifier)
+        return None if docId == IdentifierStamps.UNKNOWN else docId
+
     def _updateOaiRecord(self, identifier, setSpecs, metadataPrefixes, delete=False, oldDoc=None, deleteInSets=None, deleteInPrefixes=None, _overrideStamp=None):
         oldDoc = oldDoc or self._getDocument(identifier)
-        doc, oldDeletedSets, oldDeletedPrefixes = self._getNewDocument(identifier, oldDoc=oldDoc)
         newStamp = _overrideStamp if self._importMode else self._newStamp()
-        doc.add(LongPoint(STAMP_FIELD, int(newStamp)))
-        doc.add(StoredField(STAMP_FIELD, BytesRef(JArray('byte')(int_to_bytes(newStamp)))))
-        doc.add(NumericDocValuesField(NUMERIC_STAMP_FIELD, int(newStamp)))
+        doc, allMetadataPrefixes, allSets = self._createDocument(identifier=identifier, setSpecs=setSpecs, metadataPrefixes=metadataPrefixes, newStamp=newStamp, delete=delete, oldDoc=oldDoc, deleteInSets=deleteInSets, deleteInPrefixes=deleteInPrefixes)
+        self._writeDocument(identifier, doc)
+        self._updateCounters(oldDoc, -1)
+        self._updateCounters(doc, 1)
+        self._addPendingDocument(identifier, doc)
+        self.do.signalOaiUpdate(metadataPrefixes=allMetadataPrefixes, sets=allSets, stamp=newStamp)
+        self._maybeReopen()
+
+    def _updateOaiRecords(self, updates, batchSize):
+        updates = iter(updates)
+        while True:
+            batch = list(islice(updates, batchSize))
+            if not batch:
+                break
+            self._updateOaiRecordsBatch(batch)
+
+    def _updateOaiRecordsBatch(self, batch):
+        oldDocs = self._getDocuments(set(update['identifier'] for update in batch))
+        known = set(oldDocs)
+        updates = []
+        for update in batch:
+            identifier = update['identifier']
+            if update.get('delete') and identifier not in known and self._isDeleteOfUnknownRecord(oldDoc=None, metadataPrefixes=update['metadataPrefixes'], setSpecs=update['setSpecs']):
+                continue
+            known.add(identifier)
+            updates.append(update)
+        if not updates:
+            return
+        stamps = iter(self._newStamps(len(updates)))
+        newDocs = {}
+        allMetadataPrefixes, allSets = set(), set()
+        for update in updates:
+            identifier = update['identifier']
+            oldDoc = newDocs[identifier] if identifier in newDocs else oldDocs.get(identifier)
+            newStamp = next(stamps)
+            newDocs[identifier], metadataPrefixes, sets = self._createDocument(newStamp=newStamp, oldDoc=oldDoc, **update)
+            self._updateCounters(oldDoc, -1)
+            self._updateCounters(newDocs[identifier], 1)
+            allMetadataPrefixes.update(metadataPrefixes)
+            allSets.update(sets)
+
+        for identifier, doc in newDocs.items():
+            self._writeDocument(identifier, doc)
+        for identifier, doc in newDocs.items():
+            self._addPendingDocument(identifier, doc)
+        self.do.signalOaiUpdate(metadataPrefixes=allMetadataPrefixes, sets=allSets, stamp=newStamp)
+        self._maybeReopen()
+
+    def _writeDocument(self, identifier, doc):
+        """replaces the previous version; before the reopen that makes doc visible"""
+        self._writer.updateDocument(Term(IDENTIFIER_FIELD, identifier), doc)
+
+    def _createDocument(self, identifier, setSpecs, metadataPrefixes, newStamp, delete=False, oldDoc=None, deleteInSets=None, deleteInPrefixes=None):
+        doc, oldDeletedSets, oldDeletedPrefixes = self._getNewDocument(identifier, oldDoc=oldDoc)
+        _addStamp(doc, newStamp)
 
         allMetadataPrefixes, allDeletedPrefixes = self._setMetadataPrefixes(doc=doc, metadataPrefixes=asSet(metadataPrefixes), delete=delete, deleteInPrefixes=asSet(deleteInPrefixes), oldDeletedPrefixes=oldDeletedPrefixes)
 
         allSets, allDeletedSets = self._setSets(doc=doc, setSpecs=setSpecs or [], delete=delete, deleteInSets=deleteInSets, oldDeletedSets=oldDeletedSets)
         if delete or (allDeletedSets and allSets == allDeletedSets) or allMetadataPrefixes == allDeletedPrefixes:
-            doc.add(StringField(TOMBSTONE_FIELD, TOMBSTONE_VALUE, Field.Store.YES))
+            _addTombstone(doc)
+        return doc, allMetadataPrefixes, allSets
 
-        self._writer.updateDocument(Term(IDENTIFIER_FIELD, identifier), doc)
-        self._latestModifications.add(str(identifier))
-        self.do.signalOaiUpdate(metadataPrefixes=allMetadataPrefixes, sets=allSets, stamp=newStamp)
+    def _isDeleteOfUnknownRecord(self, oldDoc, metadataPrefixes, setSpecs):
+        if oldDoc is None and not metadataPrefixes:
+            if setSpecs:
+                raise ValueError('setSpec not allowed for unknown record if no metadataPrefixes are provided')
+            return True
+        return False
 
     def _getNewDocument(self, identifier, oldDoc, purgeSets=None):
         doc = Document()
         doc.add(StringField(IDENTIFIER_FIELD, identifier, Field.Store.YES))
+        doc.add(BinaryDocValuesField(IDENTIFIER_FIELD, BytesRef(identifier)))
         doc.add(IntPoint(HASH_FIELD, Partition.hashId(identifier)))
         oldDeletedSets = set()
         oldDeletedPrefixes = set()
@@ -429,9 +763,9 @@ class OaiJazz(Observable):
             if purgeSets:
                 filterPurgedSets = lambda sets: [s for s in sets if s not in purgeSets]
             for oldPrefix in oldDoc.getValues(PREFIX_FIELD):
-                doc.add(StringField(PREFIX_FIELD, oldPrefix, Field.Store.YES))
+                _addStringField(doc, PREFIX_FIELD, oldPrefix)
             for oldSet in filterPurgedSets(oldDoc.getValues(SETS_FIELD)):
-                doc.add(StringField(SETS_FIELD, oldSet, Field.Store.YES))
+                _addStringField(doc, SETS_FIELD, oldSet)
             oldDeletedSets.update(oldDoc.getValues(SETS_DELETED_FIELD))
             oldDeletedPrefixes.update(filterPurgedSets(oldDoc.getValues(PREFIX_DELETED_FIELD)))
         return doc, oldDeletedSets, oldDeletedPrefixes
@@ -444,6 +778,15 @@ class OaiJazz(Observable):
         self._newestStamp = newStamp
         return newStamp
 
+    def _newGeneration(self):
+        self._data['generation'] = max(self.getGeneration() + 1, timestamp())
+
+    def _newStamps(self, count):
+        """contiguous block of count stamps"""
+        firstStamp = self._newStamp()
+        self._newestStamp = max(self._newestStamp, firstStamp + count - 1)
+        return range(firstStamp, firstStamp + count)
+
     def _setMetadataPrefixes(self, doc, metadataPrefixes, delete, oldDeletedPrefixes, deleteInPrefixes):
         allMetadataPrefixes = set(doc.getValues(PREFIX_FIELD))
         allDeletedPrefixes = set(oldDeletedPrefixes)
@@ -451,7 +794,7 @@ class OaiJazz(Observable):
             allDeletedPrefixes.discard(prefix)
         for prefix in metadataPrefixes.union(deleteInPrefixes):
             if prefix not in allMetadataPrefixes:
-                doc.add(StringField(PREFIX_FIELD, prefix, Field.Store.YES))
+                _addStringField(doc, PREFIX_FIELD, prefix)
                 self._prefixes.setdefault(prefix, ('', ''))
                 allMetadataPrefixes.add(prefix)
         allDeletedPrefixes.update(deleteInPrefixes)
@@ -459,7 +802,7 @@ class OaiJazz(Observable):
             allDeletedPrefixes = allMetadataPrefixes
 
         for prefix in allDeletedPrefixes:
-            doc.add(StringField(PREFIX_DELETED_FIELD, prefix, Field.Store.YES))
+            _addStringField(doc, PREFIX_DELETED_FIELD, prefix)
 
         return allMetadataPrefixes, allDeletedPrefixes
 
@@ -480,10 +823,10 @@ class OaiJazz(Observable):
         for aSet in allSets:
             if not aSet in currentSets:
                 self._sets.setdefault(aSet, '')
-                doc.add(StringField(SETS_FIELD, aSet, Field.Store.YES))
+                _addStringField(doc, SETS_FIELD, aSet)
                 allSets.add(aSet)
         for aSet in allDeletedSets:
-            doc.add(StringField(SETS_DELETED_FIELD, aSet, Field.Store.YES))
+            _addStringField(doc, SETS_DELETED_FIELD, aSet)
         return allSets, allDeletedSets
 
     def _purge(self, identifier):
@@ -498,6 +841,51 @@ class OaiJazz(Observable):
             return None
         return _stampFromDocument(doc)
 
+    def _updateCounters(self, doc, increment):
+        if doc is None:
+            return
+        deletes = increment if doc.getField(TOMBSTONE_FIELD) is not None else 0
+        counters = [self._counters['all']]
+        counters.extend(self._counters['prefixes'].setdefault(prefix, {'total': 0, 'deletes': 0}) for prefix in doc.getValues(PREFIX_FIELD))
+        counters.extend(self._counters['sets'].setdefault(setSpec, {'total': 0, 'deletes': 0}) for setSpec in doc.getValues(SETS_FIELD))
+        for counter in counters:
+            counter['total'] += increment
+            counter['deletes'] += deletes
+
+    def _rebuildCounters(self):
+        reader = self._getSearcher().getIndexReader()
+        def count(field, value):
+            total, deletes = TermBitSets.countTerm(reader, Term(field, value))
+            return {'total': total, 'deletes': deletes}
+        self._counters = dict(
+            all={'total': reader.numDocs(), 'deletes': count(TOMBSTONE_FIELD, TOMBSTONE_VALUE)['total']},
+            prefixes=dict((prefix, count(PREFIX_FIELD, prefix)) for prefix in self._prefixes),
+            sets=dict((setSpec, count(SETS_FIELD, setSpec)) for setSpec in self._sets),
+        )
+
+    def _saveCounters(self):
+        filename = join(self._directory, "counters.json")
+        with open(filename + "~", 'w') as f:
+            dump(dict(
+                version=self.version,
+                generation=self._commitGeneration(),
+                counters=self._counters), f)
+        rename(filename + "~", filename)
+
+    def _loadCounters(self):
+        path = join(self._directory, "counters.json")
+        if not isfile(path):
+            return None
+        with open(path) as fp:
+            data = load(fp)
+        if data.get('version') != self.version or \
+                data.get('generation') != self._commitGeneration():
+            return None
+        return data['counters']
+
+    def _commitGeneration(self):
+        return SegmentInfos.getLastCommitGeneration(self._writer.getDirectory())
+
     def _save(self):
         filename = join(self._directory, "data.json")
         with open(filename + "~", 'w') as f:
@@ -517,15 +905,38 @@ class OaiJazz(Observable):
 def getReader(path):
     return DirectoryReader.open(FSDirectory.open(Paths.get(path)))
 
-def getLucene(path):
+def getLucene(path, warmSegments=True, tuningProfile=None, searchExecutor=None):
     directory = FSDirectory.open(Paths.get(path))
     analyzer = WhitespaceAnalyzer()
     config = IndexWriterConfig(analyzer)
     config.setIndexSort(Sort(SortField(NUMERIC_STAMP_FIELD, SortField.Type.LONG)))
+    if tuningProfile is not None:
+        _tuneIndexWriterConfig(config, tuningProfile)
+    if warmSegments:
+        config.setMergedSegmentWarmer(SegmentWarmer())
     writer = IndexWriter(directory, config)
-    reader = writer.getReader()
-    searcher = IndexSearcher(reader)
-    return writer, reader, searcher
+    searcherFactory = OaiSearcherFactory(warmSegments, searchExecutor) if warmSegments or searchExecutor is not None else None
+    return writer, SearcherManager(writer, True, False, searcherFactory)
+
+
+def _tuneIndexWriterConfig(config, tuningProfile):
+    """Applies one of TUNING_PROFILES.
+
+    All profiles merge with LogByteSizeMergePolicy, which only merges
+    adjacent segments. In a stamp sorted index segments then cover disjoint
+    stamp ranges and old, large segments are left alone."""
+    try:
+        profile = TUNING_PROFILES[tuningProfile]
+    except KeyError:
+        raise ValueError("Unknown tuning profile '%s', expected one of: %s" % (tuningProfile, ', '.join(sorted(TUNING_PROFILES))))
+    config.setRAMBufferSizeMB(float(profile['ramBufferSizeMB']))
+    mergeScheduler = ConcurrentMergeScheduler()
+    mergeScheduler.setMaxMergesAndThreads(profile['maxMergeCount'], profile['maxMergeThreads'])
+    config.setMergeScheduler(mergeScheduler)
+    mergePolicy = LogByteSizeMergePolicy()
+    mergePolicy.setMergeFactor(profile['mergeFactor'])
+    mergePolicy.setMaxMergeMB(float(profile['maxMergeMB']))
+    config.setMergePolicy(mergePolicy)
 
 
 class Record(object):
@@ -600,6 +1011,45 @@ class Record(object):
             )
 
 
+class DocValuesRecord(Record):
+    """Record with its fields read from doc values; the stored document is never loaded."""
+    def __init__(self, identifier, stamp, isDeleted, prefixes, deletedPrefixes, sets, deletedSets, **kwargs):
+        Record.__init__(self, doc=None, **kwargs)
+        self._identifier = identifier
+        self._stamp = stamp
+        self._isDeleted = isDeleted
+        self._prefixes = prefixes
+        self._deletedPrefixes = deletedPrefixes
+        self._sets = sets
+        self._deletedSets = deletedSets
+
+
+def _headerRecords(headers, **recordKwargs):
+    stamps = list(headers.stamps)
+    tombstones = list(headers.tombstones)
+    identifiers = headers.identifiers.bytes_
+    identifierOffsets = list(headers.identifierOffsets)
+    terms = [str(term) for term in headers.terms]
+    ords = list(headers.ords)
+    ordOffsets = list(headers.ordOffsets)
+    nrOfFields = len(_HEADER_VALUE_FIELDS)
+
+    def values(i, field):
+        j = i * nrOfFields + _HEADER_VALUE_FIELDS.index(field)
+        return set(terms[ord] for ord in ords[ordOffsets[j]:ordOffsets[j + 1]])
+
+    return [DocValuesRecord(
+                identifier=identifiers[identifierOffsets[i]:identifierOffsets[i + 1]].decode('utf-8'),
+                stamp=stamps[i],
+                isDeleted=tombstones[i],
+                prefixes=values(i, PREFIX_FIELD),
+                deletedPrefixes=values(i, PREFIX_DELETED_FIELD),
+                sets=values(i, SETS_FIELD),
+                deletedSets=values(i, SETS_DELETED_FIELD),
+                **recordKwargs)
+            for i in range(headers.size)]
+
+
 def _setSpecAndSubsets(setSpec):
     subsets = setSpec.split(SETSPEC_HIERARCHY_SEPARATOR)
     for i in range(len(subsets), 0, -1):
@@ -618,10 +1068,42 @@ def _validSetSpecs(setSpecs):
         yield setSpec
 
 
+def _exportLines(records):
+    encode = _EXPORT_ENCODER.encode
+    return ''.join(encode(record.asExportDict()) + '\n' for record in records).encode()
+
+def _openExportFile(filename, compress):
+    if compress:
+        return GzipFile(filename, 'wb', compresslevel=_EXPORT_COMPRESSION_LEVEL)
+    return open(filename, 'wb', buffering=_EXPORT_BUFFER_SIZE)
+
+def _openDump(filename):
+    with open(filename, 'rb') as f:
+        gzipped = f.read(2) == _GZIP_MAGIC
+    return TextIOWrapper(GzipFile(filename, 'rb')) if gzipped else open(filename)
+
+
+def _attachCurrentThread():
+    getVMEnv().attachCurrentThread()
+
+
 def _stampFromDocument(doc):
     return bytes_to_int(doc.getField(STAMP_FIELD).binaryValue().bytes.bytes_)
 
 
+def _addStringField(doc, name, value):
+    doc.add(StringField(name, value, Field.Store.YES))
+    doc.add(SortedSetDocValuesField(name, BytesRef(value)))
+
+def _addStamp(doc, stamp):
+    doc.add(StoredField(STAMP_FIELD, BytesRef(JArray('byte')(int_to_bytes(stamp)))))
+    doc.add(LongPoint(STAMP_FIELD, int(stamp)))
+    doc.add(NumericDocValuesField(NUMERIC_STAMP_FIELD, int(stamp)))
+
+def _addTombstone(doc):
+    doc.add(StringField(TOMBSTONE_FIELD, TOMBSTONE_VALUE, Field.Store.YES))
+    doc.add(NumericDocValuesField(TOMBSTONE_FIELD, 1))
+
 def asSet(iterableOrNone):
     return set() if iterableOrNone is None else set(iterableOrNone)
 
@@ -636,6 +1118,18 @@ SETSPEC_SEPARATOR = ","
 SETSPEC_HIERARCHY_SEPARATOR = ":"
 
 _MAX_MODIFICATIONS = 10000
+_EXPORT_ENCODER = JSONEncoder(sort_keys=True)
+_EXPORT_BUFFER_SIZE = 1024 * 1024
+_EXPORT_COMPRESSION_LEVEL = 6
+_GZIP_MAGIC = b'\x1f\x8b'
+
+# ingest: large buffer, wide merges; fast writes, more segments to search
+# serve: small buffer, narrow merges; few segments, more merging
+TUNING_PROFILES = {
+    'ingest': dict(ramBufferSizeMB=256, maxMergeCount=6, maxMergeThreads=3, mergeFactor=20, maxMergeMB=4096),
+    'balanced': dict(ramBufferSizeMB=64, maxMergeCount=4, maxMergeThreads=2, mergeFactor=10, maxMergeMB=2048),
+    'serve': dict(ramBufferSizeMB=32, maxMergeCount=3, maxMergeThreads=1, mergeFactor=5, maxMergeMB=2048),
+}
 
 PREFIX_FIELD = "prefix"
 PREFIX_DELETED_FIELD = "prefixdeleted"
@@ -647,3 +1141,5 @@ HASH_FIELD = 'hash'
 NUMERIC_STAMP_FIELD = "numeric_stamp"
 TOMBSTONE_FIELD = "tombstone"
 TOMBSTONE_VALUE = "T"
+
+_HEADER_VALUE_FIELDS = [str(field) for field in OaiHeaders.VALUE_FIELDS]
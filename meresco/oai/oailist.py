@@ -36,10 +36,12 @@
 ## end license ##
 
 import sys
+from collections import OrderedDict
+from itertools import islice
 from uuid import uuid4
 from traceback import print_exc
 
-from weightless.core import NoneOfTheObserversRespond
+from weightless.core import NoneOfTheObserversRespond, compose
 from meresco.core.observable import Observable
 from meresco.components.http.utils import serverErrorPlainText, successNoContentPlainText
 
@@ -48,6 +50,7 @@ from .oaiutils import checkNoRepeatedArguments, checkNoMoreArguments, checkArgum
 from .oaierror import oaiError
 from .oaijazz import DEFAULT_BATCH_SIZE
 from .suspendregister import ForcedResumeException
+from .compression import GzipMemberCache
 
 from meresco.oaicommon import Partition, ResumptionToken, resumptionTokenFromString
 
@@ -98,11 +101,15 @@ Error and Exception Conditions
     * noSetHierarchy - The repository does not support sets.
 """
 
-    def __init__(self, repository, batchSize=DEFAULT_BATCH_SIZE, supportXWait=False, dataBatchSize=DEFAULT_DATA_BATCH_SIZE):
+    def __init__(self, repository, batchSize=DEFAULT_BATCH_SIZE, supportXWait=False, dataBatchSize=DEFAULT_DATA_BATCH_SIZE, asyncDataFetch=False, renderChunkSize=0, fragmentCacheSize=0, pageCacheSize=0):
         self._supportedVerbs = ['ListIdentifiers', 'ListRecords']
         Observable.__init__(self)
         self._batchSize = batchSize
         self._dataBatchSize = dataBatchSize
+        self._asyncDataFetch = asyncDataFetch
+        self._renderChunkSize = renderChunkSize
+        self._fragmentCache = GzipMemberCache(maxBytes=fragmentCacheSize) if fragmentCacheSize else None
+        self._pageCache = _PageCache(maxBytes=pageCacheSize) if pageCacheSize else None
         self._supportXWait = supportXWait
         self._repository = repository
 
@@ -155,8 +162,7 @@ Error and Exception Conditions
         yield oaiHeader(self, responseDate)
         yield oaiRequestArgs(requestArguments, requestUrl=self._repository.requestUrl(**httpkwargs), **httpkwargs)
         yield '<%s>' % verb
-        yield self._renderRecords(verb, result, selectArguments)
-        yield self._renderResumptionToken(result, selectArguments)
+        yield self._renderPage(verb, result, selectArguments)
         yield '</%s>' % verb
 
         yield oaiFooter()
@@ -251,15 +257,106 @@ Error and Exception Conditions
         sys.stderr.flush()
         return str(uuid4())
 
-    def _renderRecords(self, verb, result, selectArguments):
-        allrecords = list(result.records)
+    def _renderPage(self, verb, result, selectArguments):
+        if self._pageCache is None or selectArguments['shouldCountHits'] or selectArguments['x-wait']:
+            yield self._renderRecordsAndResumptionToken(verb, result.records, result, selectArguments)
+            return
+        # A page stays valid as long as the same records with the same stamps are selected.
+        records = list(result.records)
+        key = _pageKey(verb, selectArguments)
+        fingerprint = (tuple((r.identifier, r.stamp, r.isDeleted) for r in records), result.moreRecordsAvailable)
+        cached = self._pageCache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            yield cached[1]
+            return
+        rendered = compose(self._renderRecordsAndResumptionToken(verb, records, result, selectArguments))
+        fragments = []
+        for fragment in rendered:
+            if type(fragment) is bytes:
+                fragment = fragment.decode()
+            if not isinstance(fragment, str):
+                # e.g. suspended for asynchronous data; this page is not cached
+                yield ''.join(fragments)
+                yield fragment
+                yield rendered
+                return
+            fragments.append(fragment)
+        page = ''.join(fragments)
+        self._pageCache.add(key, fingerprint, page)
+        yield page
+
+    def _renderRecordsAndResumptionToken(self, verb, records, result, selectArguments):
+        renderedRecords = self._renderRecords(verb, records, selectArguments)
+        yield self._inChunks(renderedRecords) if self._renderChunkSize else renderedRecords
+        yield self._renderResumptionToken(result, selectArguments)
+
+    def _renderRecords(self, verb, records, selectArguments):
+        allrecords = iter(records)
         prefix = selectArguments['prefix']
         message = "oaiRecord" if verb == 'ListRecords' else "oaiRecordHeader"
-        for i in range(0, len(allrecords), self._dataBatchSize):
-            records = allrecords[i:i+self._dataBatchSize]
-            fetchedRecords = self._getMultipleData(prefix=prefix, records=records)
+        useFragmentCache = self._fragmentCache is not None and message == 'oaiRecord'
+        while True:
+            records = list(islice(allrecords, self._dataBatchSize))
+            if not records:
+                break
+            cachedFragments = {}
+            if useFragmentCache:
+                for record in records:
+                    fragment = self._fragmentCache.get(_fragmentKey(record, prefix))
+                    if fragment is not None:
+                        cachedFragments[record.identifier] = fragment
+            recordsToFetch = [r for r in records if r.identifier not in cachedFragments]
+            fetchedRecords = None
+            if recordsToFetch:
+                fetchedRecords = self._getMultipleData(prefix=prefix, records=recordsToFetch)
+                if fetchedRecords is None and self._asyncDataFetch:
+                    # Records rendered so far are written while this batch is retrieved
+                    fetchedRecords = yield self._retrieveMultipleData(prefix=prefix, records=recordsToFetch)
             for record in records:
-                yield self.all.unknown(message, record=record, metadataPrefix=prefix, fetchedRecords=fetchedRecords)
+                if record.identifier in cachedFragments:
+                    yield cachedFragments[record.identifier]
+                elif useFragmentCache:
+                    yield self._renderAndCacheRecord(record=record, prefix=prefix, fetchedRecords=fetchedRecords)
+                else:
+                    yield self.all.unknown(message, record=record, metadataPrefix=prefix, fetchedRecords=fetchedRecords)
+                if self._renderChunkSize:
+                    yield _RECORD_RENDERED
+
+    def _renderAndCacheRecord(self, record, prefix, fetchedRecords):
+        rendered = compose(self.all.oaiRecord(record=record, metadataPrefix=prefix, fetchedRecords=fetchedRecords))
+        fragments = []
+        for fragment in rendered:
+            if type(fragment) is bytes:
+                fragment = fragment.decode()
+            if type(fragment) is not str:
+                # e.g. suspended for asynchronous data; this record is not cached
+                yield ''.join(fragments)
+                yield fragment
+                yield rendered
+                return
+            fragments.append(fragment)
+        yield self._fragmentCache.add(_fragmentKey(record, prefix), ''.join(fragments))
+
+    def _inChunks(self, renderedRecords):
+        # Joins the fragments of renderChunkSize records into one encoded chunk;
+        # anything else, like a Yield or suspend callable, is passed on.
+        fragments = []
+        records = 0
+        for fragment in compose(renderedRecords):
+            if fragment is _RECORD_RENDERED:
+                records += 1
+                if records % self._renderChunkSize == 0:
+                    yield ''.join(fragments).encode()
+                    fragments = []
+            elif type(fragment) is str:
+                fragments.append(fragment)
+            else:
+                if fragments:
+                    yield ''.join(fragments).encode()
+                    fragments = []
+                yield fragment
+        if fragments:
+            yield ''.join(fragments).encode()
 
     def _getMultipleData(self, prefix, records):
         try:
@@ -273,6 +370,14 @@ Error and Exception Conditions
         except NoneOfTheObserversRespond:
             return None
 
+    def _retrieveMultipleData(self, prefix, records):
+        data = yield self.any.retrieveMultipleData(
+                name=prefix,
+                identifiers=[r.identifier for r in records if not r.isDeleted],
+                ignoreMissing=True
+            )
+        return dict(data)
+
     def _renderResumptionToken(self, result, selectArguments):
         if result.moreRecordsAvailable or selectArguments['x-wait']:
             if selectArguments['shouldCountHits']:
@@ -290,4 +395,43 @@ Error and Exception Conditions
         elif 'resumptionToken' in selectArguments:
             yield '<resumptionToken/>'
 
+def _pageKey(verb, selectArguments):
+    return (verb, 'resumptionToken' in selectArguments) + tuple(str(selectArguments[name]) for name in ['prefix', 'sets', 'oaiFrom', 'oaiUntil', 'partition', 'continueAfter', 'batchSize'])
+
+def _fragmentKey(record, prefix):
+    return (record.identifier, prefix, record.stamp, record.isDeleted)
+
+
+class _PageCache(object):
+    """Least recently used rendered pages up to a total size of maxBytes."""
+    def __init__(self, maxBytes):
+        self._maxBytes = maxBytes
+        self._pages = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        cached = self._pages.pop(key, None)
+        if cached is None:
+            return None
+        self._pages[key] = cached
+        fingerprint, page, _ = cached
+        return fingerprint, page
+
+    def add(self, key, fingerprint, page):
+        previous = self._pages.pop(key, None)
+        if previous is not None:
+            self._size -= previous[2]
+        size = len(page.encode())
+        if size > self._maxBytes:
+            return
+        while self._pages and self._size + size > self._maxBytes:
+            _, (_, _, evictedSize) = self._pages.popitem(last=False)
+            self._size -= evictedSize
+        self._pages[key] = (fingerprint, page, size)
+        self._size += size
+
+    def __len__(self):
+        return len(self._pages)
+
 MAX_RATIO = 1.1
+_RECORD_RENDERED = object()
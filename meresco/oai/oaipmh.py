@@ -40,6 +40,7 @@
 
 from urllib.parse import parse_qs
 import re
+from zlib import crc32
 
 from weightless.core import be, compose
 from meresco.core import Transparent, Observable
@@ -53,17 +54,26 @@ from .oailistsets import OaiListSets
 from .oaierror import OaiError
 from .oairecord import OaiRecord
 from .oairepository import OaiRepository
+from .compression import acceptedEncoding, compressResponse, DEFAULT_COMPRESSION_LEVEL, DEFAULT_MINIMUM_SIZE
+from .conditionalrequest import entityTag, isNotModified, notModifiedResponse, addValidatorHeaders
 
 
 class OaiPmh(object):
-    def __init__(self, repositoryName, adminEmail, repositoryIdentifier=None, batchSize=DEFAULT_BATCH_SIZE, supportXWait=False, externalUrl=None, preciseDatestamp=False, deleteInSets=False):
+    def __init__(self, repositoryName, adminEmail, repositoryIdentifier=None, batchSize=DEFAULT_BATCH_SIZE, supportXWait=False, externalUrl=None, preciseDatestamp=False, deleteInSets=False, supportCompression=False, compressionLevel=DEFAULT_COMPRESSION_LEVEL, compressionMinimumSize=DEFAULT_MINIMUM_SIZE, fragmentCacheSize=0, pageCacheSize=0, supportConditionalRequests=False, asyncDataFetch=False, renderChunkSize=0, headerCacheSize=0):
         self._repository = OaiRepository(
             identifier=repositoryIdentifier,
             name=repositoryName,
             adminEmail=adminEmail,
             externalUrl=externalUrl,
         )
+        self._supportCompression = supportCompression
+        self._compressionLevel = compressionLevel
+        self._compressionMinimumSize = compressionMinimumSize
+        self._supportConditionalRequests = supportConditionalRequests
+        # Options that change the response body; an entity tag must change with them
+        self._responseOptions = repr((repositoryIdentifier, externalUrl, batchSize, preciseDatestamp, deleteInSets))
         outside = Transparent()
+        self._outside = outside
         self.addObserver = outside.addObserver
         self.addStrand = outside.addStrand
         self._internalObserverTree = be(
@@ -72,13 +82,13 @@ class OaiPmh(object):
                     (OaiIdentify(self._repository),
                         (outside,)
                     ),
-                    (OaiList(repository=self._repository, batchSize=batchSize, supportXWait=supportXWait),
-                        (OaiRecord(self._repository, preciseDatestamp=preciseDatestamp, deleteInSets=deleteInSets),
+                    (OaiList(repository=self._repository, batchSize=batchSize, supportXWait=supportXWait, asyncDataFetch=asyncDataFetch, renderChunkSize=renderChunkSize, fragmentCacheSize=fragmentCacheSize, pageCacheSize=pageCacheSize),
+                        (OaiRecord(self._repository, preciseDatestamp=preciseDatestamp, deleteInSets=deleteInSets, headerCacheSize=headerCacheSize),
                             (outside,)
                         )
                     ),
                     (OaiGetRecord(self._repository),
-                        (OaiRecord(self._repository, preciseDatestamp=preciseDatestamp, deleteInSets=deleteInSets),
+                        (OaiRecord(self._repository, preciseDatestamp=preciseDatestamp, deleteInSets=deleteInSets, headerCacheSize=headerCacheSize),
                             (outside,)
                         )
                     ),
@@ -106,6 +116,20 @@ class OaiPmh(object):
             arguments.update(parse_qs(str(Body, encoding="utf-8"), keep_blank_values=True))
         verb = arguments.get('verb', [None])[0]
         message = verb[0].lower() + verb[1:] if verb else ''
-        yield self._internalObserverTree.all.unknown(message, arguments=arguments, **kwargs)
+        response = self._internalObserverTree.all.unknown(message, arguments=arguments, **kwargs)
+        if self._supportConditionalRequests and not 'x-wait' in arguments:
+            lastStamp = self._outside.call.getLastStampId(prefix=None) or 0
+            generation = self._outside.call.getGeneration()
+            etag = entityTag(lastStamp, generation, crc32(('%s %s %s' % (self._repository.name, self._repository.adminEmail, self._responseOptions)).encode()))
+            lastModified = max(lastStamp, generation)
+            if isNotModified(kwargs.get('Headers'), etag, lastModified):
+                yield notModifiedResponse(etag, lastModified)
+                return
+            response = addValidatorHeaders(response, etag, lastModified)
+        encoding = acceptedEncoding(kwargs.get('Headers')) if self._supportCompression else None
+        if encoding is None:
+            yield response
+            return
+        yield compressResponse(response, encoding=encoding, level=self._compressionLevel, minimumSize=self._compressionMinimumSize)
 
 
@@ -32,6 +32,7 @@
 #
 ## end license ##
 
+from collections import OrderedDict
 from xml.sax.saxutils import escape as xmlEscape
 
 from weightless.core import compose, NoneOfTheObserversRespond
@@ -40,13 +41,29 @@ from meresco.core.generatorutils import decorate
 
 
 class OaiRecord(Transparent):
-    def __init__(self, repository=None, preciseDatestamp=False, deleteInSets=False, **kwargs):
+    def __init__(self, repository=None, preciseDatestamp=False, deleteInSets=False, headerCacheSize=0, **kwargs):
         Transparent.__init__(self, **kwargs)
         self._repository = repository
         self._preciseDatestamp = preciseDatestamp
         self._deleteInSetsSupport = deleteInSets
+        self._headerCacheSize = headerCacheSize
+        self._headerCache = OrderedDict()
 
     def oaiRecordHeader(self, record, **kwargs):
+        if not self._headerCacheSize:
+            yield self._oaiRecordHeader(record)
+            return
+        # A record only changes with a new stamp; deleted depends on the requested prefix and sets.
+        key = (record.identifier, record.stamp, record.isDeleted)
+        header = self._headerCache.pop(key, None)
+        if header is None:
+            header = ''.join(self._oaiRecordHeader(record))
+            if len(self._headerCache) >= self._headerCacheSize:
+                self._headerCache.popitem(last=False)
+        self._headerCache[key] = header
+        yield header
+
+    def _oaiRecordHeader(self, record):
         isDeletedStr = ' status="deleted"' if record.isDeleted else ''
         datestamp = record.getDatestamp(preciseDatestamp=self._preciseDatestamp)
         identifier = record.identifier
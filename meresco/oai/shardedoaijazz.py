@@ -0,0 +1,269 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from heapq import merge
+from itertools import islice
+from os import listdir, makedirs
+from os.path import join, isdir
+from threading import Lock
+
+from meresco.core import Observable
+from meresco.oaicommon import timestamp, Partition
+
+from .oaijazz import OaiJazz, DEFAULT_BATCH_SIZE, DEFAULT_UPDATE_BATCH_SIZE, _attachCurrentThread
+
+
+class ShardedOaiJazz(Observable):
+    """OaiJazz spread over nrOfShards independent indexes by Partition.hashId of the identifier.
+
+    All shards take their stamps from one allocator, so stamps are unique
+    and increasing over all shards. oaiSelect merges the sorted batches of
+    the shards on stamp; getRecord and updates go to the shard of the
+    identifier. With writeThreads, addOaiRecords and deleteOaiRecords write
+    to the shards concurrently. Prefixes and sets are those of all shards
+    together: adding a record registers them in its own shard only.
+    maxSearcherStaleness is not supported: shards refreshed independently
+    could show a newer stamp of one shard in a merged batch while an older
+    stamp of another shard is not yet visible.
+    """
+    def __init__(self, aDirectory, nrOfShards, name=None, writeThreads=None, **kwargs):
+        Observable.__init__(self, name=name)
+        if kwargs.get('maxSearcherStaleness') is not None:
+            raise ValueError("maxSearcherStaleness is not supported by ShardedOaiJazz")
+        if not isdir(aDirectory):
+            makedirs(aDirectory)
+        existingShards = [d for d in listdir(aDirectory) if d.startswith('shard-')]
+        if existingShards and len(existingShards) != nrOfShards:
+            raise ValueError("Index at %s has %s shards, not %s." % (aDirectory, len(existingShards), nrOfShards))
+        self._directory = aDirectory
+        self._stamps = _StampAllocator()
+        self._signals = _SignalForwarder(self)
+        self._shards = []
+        for i in range(nrOfShards):
+            shard = _Shard(join(aDirectory, 'shard-%s' % i), stampAllocator=self._stamps, **kwargs)
+            shard.addObserver(self._signals)
+            self._shards.append(shard)
+        self._stamps.newestStamp = max(shard._newestStamp for shard in self._shards)
+        self._executor = None
+        if writeThreads:
+            self._executor = ThreadPoolExecutor(max_workers=writeThreads, initializer=_attachCurrentThread)
+
+    def oaiSelect(self, batchSize=None, shouldCountHits=False, **kwargs):
+        batchSize = DEFAULT_BATCH_SIZE if batchSize is None else batchSize
+        results = [shard.oaiSelect(batchSize=batchSize, shouldCountHits=shouldCountHits, **kwargs) for shard in self._shards]
+        records = list(islice(merge(*[list(result.records) for result in results], key=lambda record: record.stamp), batchSize + 1))
+        result = _ShardedOaiSelectResult(
+            records=records[:batchSize],
+            moreRecordsAvailable=len(records) > batchSize or any(result.moreRecordsAvailable for result in results))
+        if shouldCountHits:
+            totalHits = sum(result.numberOfRecordsInBatch + result.recordsRemaining for result in results)
+            result.recordsRemaining = max(0, totalHits - result.numberOfRecordsInBatch)
+        return result
+
+    def addOaiRecord(self, identifier, metadataPrefixes=None, setSpecs=None):
+        self._shardFor(identifier).addOaiRecord(identifier, metadataPrefixes=metadataPrefixes, setSpecs=setSpecs)
+
+    def addOaiRecords(self, records, batchSize=DEFAULT_UPDATE_BATCH_SIZE):
+        "Bulk variant of addOaiRecord; records is an iterable of dicts with the keyword arguments of addOaiRecord."
+        self._updatePerShard(records, lambda record: record.get('identifier'), lambda shard, records: shard.addOaiRecords(records, batchSize=batchSize), batchSize)
+
+    def deleteOaiRecords(self, identifiers, batchSize=DEFAULT_UPDATE_BATCH_SIZE):
+        "Bulk variant of deleteOaiRecord."
+        self._updatePerShard(identifiers, lambda identifier: identifier, lambda shard, identifiers: shard.deleteOaiRecords(identifiers, batchSize=batchSize), batchSize)
+
+    def delete(self, identifier):
+        self.deleteOaiRecord(identifier=identifier)
+        return
+        yield
+
+    def deleteOaiRecord(self, identifier, setSpecs=None, metadataPrefixes=None):
+        self._shardFor(identifier).deleteOaiRecord(identifier, setSpecs=setSpecs, metadataPrefixes=metadataPrefixes)
+
+    def deleteOaiRecordInPrefixes(self, identifier, metadataPrefixes):
+        self._shardFor(identifier).deleteOaiRecordInPrefixes(identifier, metadataPrefixes)
+
+    def deleteOaiRecordInSets(self, identifier, setSpecs):
+        self._shardFor(identifier).deleteOaiRecordInSets(identifier, setSpecs)
+
+    def purge(self, identifier, ignorePeristentDelete=False):
+        self._shardFor(identifier).purge(identifier, ignorePeristentDelete=ignorePeristentDelete)
+
+    def purgeFromSet(self, setSpec, ignorePeristentDelete=False):
+        for shard in self._shards:
+            shard.purgeFromSet(setSpec, ignorePeristentDelete=ignorePeristentDelete)
+
+    def overrideRecord(self, identifier, metadataPrefixes, setSpecs, ignoreOaiSpec=False):
+        self._shardFor(identifier).overrideRecord(identifier, metadataPrefixes, setSpecs, ignoreOaiSpec=ignoreOaiSpec)
+
+    def updateMetadataFormat(self, prefix, schema, namespace):
+        for shard in self._shards:
+            shard.updateMetadataFormat(prefix, schema, namespace)
+
+    def getAllMetadataFormats(self):
+        formats = {}
+        for shard in self._shards:
+            for prefix, schema, namespace in shard.getAllMetadataFormats():
+                formats.setdefault(prefix, (schema, namespace))
+        for prefix, (schema, namespace) in formats.items():
+            yield (prefix, schema, namespace)
+
+    def getAllPrefixes(self):
+        return set().union(*(shard.getAllPrefixes() for shard in self._shards))
+
+    def isKnownPrefix(self, prefix):
+        return any(shard.isKnownPrefix(prefix) for shard in self._shards)
+
+    def updateSet(self, setSpec, setName):
+        for shard in self._shards:
+            shard.updateSet(setSpec, setName)
+
+    def getAllSets(self, includeSetNames=False):
+        if not includeSetNames:
+            return set().union(*(shard.getAllSets() for shard in self._shards))
+        setNames = {}
+        for shard in self._shards:
+            for setSpec, setName in shard.getAllSets(includeSetNames=True):
+                if setName or setSpec not in setNames:
+                    setNames[setSpec] = setName
+        return set(setNames.items())
+
+    def getNrOfRecords(self, prefix='oai_dc', setSpec=None, continueAfter=None, oaiFrom=None, oaiUntil=None, partition=None):
+        counts = [shard.getNrOfRecords(prefix=prefix, setSpec=setSpec, continueAfter=continueAfter, oaiFrom=oaiFrom, oaiUntil=oaiUntil, partition=partition) for shard in self._shards]
+        return {'total': sum(count['total'] for count in counts), 'deletes': sum(count['deletes'] for count in counts)}
+
+    def getRecord(self, identifier, metadataPrefix=None):
+        return self._shardFor(identifier).getRecord(identifier, metadataPrefix=metadataPrefix)
+
+    def getDeletedRecordType(self):
+        return self._shards[0].getDeletedRecordType()
+
+    def getGeneration(self):
+        return max(shard.getGeneration() for shard in self._shards)
+
+    def getLastStampId(self, prefix='oai_dc', setSpec=None):
+        stamps = [stamp for stamp in (shard.getLastStampId(prefix=prefix, setSpec=setSpec) for shard in self._shards) if stamp is not None]
+        return max(stamps) if stamps else None
+
+    def commit(self):
+        for shard in self._shards:
+            shard.commit()
+
+    def handleShutdown(self):
+        print('handle shutdown: saving ShardedOaiJazz %s' % self._directory)
+        from sys import stdout; stdout.flush()
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+        for shard in self._shards:
+            shard.close()
+
+    export = OaiJazz.export
+    _exportBatches = OaiJazz._exportBatches
+
+    def _shardFor(self, identifier):
+        return self._shards[Partition.hashId(identifier) % len(self._shards)]
+
+    def _updatePerShard(self, items, identifierOf, update, batchSize):
+        items = iter(items)
+        while True:
+            chunk = list(islice(items, batchSize * len(self._shards)))
+            if not chunk:
+                break
+            perShard = {}
+            for item in chunk:
+                identifier = identifierOf(item)
+                if not identifier:
+                    raise ValueError("Empty identifier not allowed.")
+                perShard.setdefault(self._shardFor(identifier), []).append(item)
+            if self._executor is None:
+                for shard, shardItems in perShard.items():
+                    update(shard, shardItems)
+                continue
+            with self._signals.buffered():
+                for future in [self._executor.submit(update, shard, shardItems) for shard, shardItems in perShard.items()]:
+                    future.result()
+
+
+class _Shard(OaiJazz):
+    def __init__(self, aDirectory, stampAllocator, **kwargs):
+        self._stampAllocator = stampAllocator
+        OaiJazz.__init__(self, aDirectory, **kwargs)
+
+    def _newStamp(self):
+        return self._newStamps(1)[0]
+
+    def _newStamps(self, count):
+        stamps = self._stampAllocator.newStamps(count)
+        self._newestStamp = stamps[-1]
+        return stamps
+
+
+class _StampAllocator(object):
+    def __init__(self):
+        self.newestStamp = 0
+        self._lock = Lock()
+
+    def newStamps(self, count):
+        """contiguous block of count stamps, later than any stamp before"""
+        with self._lock:
+            firstStamp = max(timestamp(), self.newestStamp + 1)
+            self.newestStamp = firstStamp + count - 1
+        return range(firstStamp, firstStamp + count)
+
+
+class _SignalForwarder(object):
+    """Passes signalOaiUpdate of the shards on; while buffered, signals from
+    write threads are collected and passed on afterwards in stamp order."""
+    def __init__(self, parent):
+        self._parent = parent
+        self._buffer = None
+
+    def signalOaiUpdate(self, **kwargs):
+        if self._buffer is not None:
+            self._buffer.append(kwargs)
+            return
+        self._parent.do.signalOaiUpdate(**kwargs)
+
+    @contextmanager
+    def buffered(self):
+        self._buffer = []
+        try:
+            yield
+        finally:
+            signals, self._buffer = self._buffer, None
+            for kwargs in sorted(signals, key=lambda kwargs: kwargs['stamp']):
+                self._parent.do.signalOaiUpdate(**kwargs)
+
+
+class _ShardedOaiSelectResult(object):
+    def __init__(self, records, moreRecordsAvailable):
+        self.records = records
+        self.numberOfRecordsInBatch = len(records)
+        self.moreRecordsAvailable = moreRecordsAvailable
+        self.continueAfter = None if len(records) == 0 else records[-1].stamp
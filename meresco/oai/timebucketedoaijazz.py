@@ -0,0 +1,212 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from collections import OrderedDict
+from itertools import groupby
+from os import listdir, makedirs
+from os.path import join, isdir, isfile
+from shutil import rmtree
+from time import gmtime, strftime
+
+from meresco.oaicommon import timestamp
+
+from org.apache.lucene.index import Term, MultiReader, SegmentInfos
+from org.apache.lucene.search import IndexSearcher
+
+from .oaijazz import OaiJazz, getLucene, IDENTIFIER_FIELD, SETS_FIELD
+
+
+class TimeBucketedOaiJazz(OaiJazz):
+    """OaiJazz with a separate Lucene index (bucket) per year, month or day.
+
+    Records are written to the newest bucket and an update removes the
+    previous version from the older bucket. Stamps only increase, so buckets
+    cover disjoint stamp ranges and searches skip the segments of buckets
+    outside the requested range or after a full batch. On commit, older
+    buckets without live documents are dropped and older buckets of which at
+    least a quarter of the documents is deleted are merged in the background.
+    The bucket period of an index cannot change.
+    """
+    def __init__(self, aDirectory, bucketPeriod='month', **kwargs):
+        if bucketPeriod not in BUCKET_PERIODS:
+            raise ValueError("Unknown bucket period '%s', expected one of: %s" % (bucketPeriod, ', '.join(sorted(BUCKET_PERIODS))))
+        if kwargs.get('maxSearcherStaleness') is not None:
+            raise ValueError("maxSearcherStaleness is not supported by TimeBucketedOaiJazz")
+        if isdir(aDirectory) and any(name.startswith('segments') for name in listdir(aDirectory)):
+            raise ValueError("%s holds the index of an OaiJazz, not of a TimeBucketedOaiJazz. Export it with meresco-oai-export and import the dump with TimeBucketedOaiJazz.importDump into a new directory." % aDirectory)
+        periodFile = join(aDirectory, 'bucket.period')
+        if isfile(periodFile):
+            with open(periodFile) as fp:
+                existingPeriod = fp.read()
+            if existingPeriod != bucketPeriod:
+                raise ValueError("Index at %s has buckets per %s, not per %s." % (aDirectory, existingPeriod, bucketPeriod))
+        self._bucketPeriod = bucketPeriod
+        self._periodFormat = BUCKET_PERIODS[bucketPeriod]
+        self._bucketsDirectory = join(aDirectory, 'buckets')
+        self._buckets = OrderedDict()
+        self._bucketSearchers = []
+        OaiJazz.__init__(self, aDirectory, **kwargs)
+
+    def getBucketPeriods(self):
+        return list(self._buckets.keys())
+
+    def commit(self):
+        self._save()
+        for writer, _ in self._buckets.values():
+            writer.commit()
+        self._compactBuckets()
+        self._saveCounters()
+
+    def close(self):
+        self._save()
+        for writer, _ in self._olderBuckets():
+            writer.commit()
+        self._writer.commit()
+        self._saveCounters()
+        self._releaseSearchers()
+        for writer, searcherManager in self._buckets.values():
+            searcherManager.close()
+            writer.close()
+        if self._searchExecutor is not None:
+            self._searchExecutor.shutdown()
+
+    def _openIndex(self, **luceneOptions):
+        self._luceneOptions = luceneOptions
+        if not isdir(self._bucketsDirectory):
+            makedirs(self._bucketsDirectory)
+        with open(join(self._directory, 'bucket.period'), 'w') as f:
+            f.write(self._bucketPeriod)
+        for period in sorted(listdir(self._bucketsDirectory)):
+            self._buckets[period] = getLucene(join(self._bucketsDirectory, period), **luceneOptions)
+        if not self._buckets:
+            self._addBucket(self._period(timestamp()))
+        return next(reversed(self._buckets.values()))
+
+    def _refreshSearchers(self):
+        for _, searcherManager in self._buckets.values():
+            searcherManager.maybeRefreshBlocking()
+
+    def _acquireLatestSearcher(self):
+        searchers = [(searcherManager, searcherManager.acquire()) for _, searcherManager in self._buckets.values()]
+        if len(searchers) == len(self._bucketSearchers) and \
+                all(new.equals(old) for (_, new), (_, old) in zip(searchers, self._bucketSearchers)):
+            for searcherManager, searcher in searchers:
+                searcherManager.release(searcher)
+            return False
+        self._releaseSearchers()
+        self._bucketSearchers = searchers
+        self._reader = MultiReader([searcher.getIndexReader() for _, searcher in searchers], False)
+        self._searcher = IndexSearcher(self._reader, self._searchExecutor)
+        return True
+
+    def _releaseSearchers(self):
+        if self._searcher is not None:
+            self._reader.close()
+        for searcherManager, searcher in self._bucketSearchers:
+            searcherManager.release(searcher)
+        self._bucketSearchers = []
+
+    def _newStamp(self):
+        newStamp = OaiJazz._newStamp(self)
+        self._rollover(newStamp)
+        return newStamp
+
+    def _updateOaiRecord(self, identifier, *args, **kwargs):
+        if self._importMode and kwargs.get('_overrideStamp') is not None:
+            self._rollover(kwargs['_overrideStamp'])
+        OaiJazz._updateOaiRecord(self, identifier, *args, **kwargs)
+
+    def _writeDocument(self, identifier, doc):
+        OaiJazz._writeDocument(self, identifier, doc)
+        for writer, _ in self._olderBuckets():
+            writer.deleteDocuments(Term(IDENTIFIER_FIELD, identifier))
+
+    def _importWriters(self, stampedDocs):
+        writers = []
+        for _, periodDocs in groupby(stampedDocs, key=lambda stampedDoc: self._period(stampedDoc[0])):
+            periodDocs = list(periodDocs)
+            self._rollover(periodDocs[0][0])
+            writers.extend(OaiJazz._importWriters(self, periodDocs))
+        return writers
+
+    def _purge(self, identifier):
+        for writer, _ in self._buckets.values():
+            writer.deleteDocuments(Term(IDENTIFIER_FIELD, identifier))
+
+    def _purgeFromSet(self, setSpec):
+        for writer, _ in self._buckets.values():
+            writer.deleteDocuments(Term(SETS_FIELD, setSpec))
+
+    def _commitGeneration(self):
+        return [[period, SegmentInfos.getLastCommitGeneration(writer.getDirectory())] for period, (writer, _) in self._buckets.items()]
+
+    def _period(self, stamp):
+        return strftime(self._periodFormat, gmtime(stamp / 1000000.0))
+
+    def _olderBuckets(self):
+        return list(self._buckets.values())[:-1]
+
+    def _rollover(self, stamp):
+        period = self._period(stamp)
+        newestPeriod = next(reversed(self._buckets))
+        if period == newestPeriod:
+            return
+        if period < newestPeriod:
+            if len(self._buckets) > 1 or self._writer.getDocStats().maxDoc > 0:
+                return
+            self._dropBucket(newestPeriod)
+        self._writer, self._searcherManager = self._addBucket(period)
+
+    def _addBucket(self, period):
+        self._buckets[period] = getLucene(join(self._bucketsDirectory, period), **self._luceneOptions)
+        return self._buckets[period]
+
+    def _dropBucket(self, period):
+        writer, searcherManager = self._buckets.pop(period)
+        self._acquireLatestSearcher()
+        searcherManager.close()
+        writer.close()
+        rmtree(join(self._bucketsDirectory, period))
+
+    def _compactBuckets(self):
+        self._getSearcher()
+        emptyPeriods = []
+        for (period, (writer, _)), (_, searcher) in list(zip(self._buckets.items(), self._bucketSearchers))[:-1]:
+            reader = searcher.getIndexReader()
+            if reader.numDocs() == 0:
+                emptyPeriods.append(period)
+            elif reader.numDeletedDocs() >= _COMPACT_DELETES_RATIO * reader.maxDoc():
+                writer.forceMergeDeletes(False)
+        for period in emptyPeriods:
+            self._dropBucket(period)
+
+
+BUCKET_PERIODS = {
+    'year': '%Y',
+    'month': '%Y%m',
+    'day': '%Y%m%d',
+}
+
+_COMPACT_DELETES_RATIO = 0.25
@@ -0,0 +1,183 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.util.List;
+
+import org.apache.lucene.index.BinaryDocValues;
+import org.apache.lucene.index.IndexReader;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.LeafReaderContext;
+import org.apache.lucene.index.NumericDocValues;
+import org.apache.lucene.search.DocIdSetIterator;
+import org.apache.lucene.util.Bits;
+import org.apache.lucene.util.BytesRef;
+import org.apache.lucene.util.StringHelper;
+
+
+/**
+ * The stamp of every identifier, in an open addressing hash table over
+ * 64 bit identifier hashes.
+ *
+ * A stamp leads to its document by a binary search in the stamp sorted
+ * segments; the identifier of that document is compared to rule out hash
+ * collisions. Identifiers are never removed: a stale stamp only means the
+ * answer is UNKNOWN and the caller falls back to a term query. Only an
+ * identifier whose hash was never put is ABSENT.
+ */
+public class IdentifierStamps {
+    public static final int ABSENT = -1;
+    public static final int UNKNOWN = -2;
+    private static final String IDENTIFIER_FIELD = "identifier";
+    private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private static final float LOAD_FACTOR = 0.75f;
+
+    private long[] hashes;
+    private long[] stamps;
+    private int size = 0;
+
+    public IdentifierStamps(int expectedSize) {
+        int capacity = 16;
+        while (capacity * LOAD_FACTOR < expectedSize) {
+            capacity <<= 1;
+        }
+        this.hashes = new long[capacity];
+        this.stamps = new long[capacity];
+    }
+
+    public static IdentifierStamps fromReader(IndexReader reader) throws IOException {
+        IdentifierStamps identifierStamps = new IdentifierStamps(reader.numDocs());
+        for (LeafReaderContext context : reader.leaves()) {
+            LeafReader leafReader = context.reader();
+            Bits liveDocs = leafReader.getLiveDocs();
+            BinaryDocValues identifiers = leafReader.getBinaryDocValues(IDENTIFIER_FIELD);
+            NumericDocValues stamps = leafReader.getNumericDocValues(NUMERIC_STAMP_FIELD);
+            if (identifiers == null || stamps == null) {
+                continue;
+            }
+            for (int doc = identifiers.nextDoc(); doc != DocIdSetIterator.NO_MORE_DOCS; doc = identifiers.nextDoc()) {
+                if ((liveDocs == null || liveDocs.get(doc)) && stamps.advanceExact(doc)) {
+                    identifierStamps.put(hash(identifiers.binaryValue()), stamps.longValue());
+                }
+            }
+        }
+        return identifierStamps;
+    }
+
+    public void put(String identifier, long stamp) {
+        put(hash(new BytesRef(identifier)), stamp);
+    }
+
+    public long stamp(String identifier) {
+        int slot = slot(hash(new BytesRef(identifier)));
+        return this.hashes[slot] == 0 ? ABSENT : this.stamps[slot];
+    }
+
+    public int size() {
+        return this.size;
+    }
+
+    /**
+     * The docId of the live document of identifier in reader, ABSENT if the
+     * identifier is unknown or UNKNOWN if a term query must decide.
+     */
+    public int docId(IndexReader reader, String identifier) throws IOException {
+        BytesRef identifierBytes = new BytesRef(identifier);
+        int slot = slot(hash(identifierBytes));
+        if (this.hashes[slot] == 0) {
+            return ABSENT;
+        }
+        long stamp = this.stamps[slot];
+        List<LeafReaderContext> leaves = reader.leaves();
+        for (int i = leaves.size() - 1; i >= 0; i--) {
+            LeafReader leafReader = leaves.get(i).reader();
+            if (!SegmentStamps.get(leafReader).overlaps(stamp, stamp)) {
+                continue;
+            }
+            int doc = StampRangeQuery.firstDocAtOrAfter(leafReader, stamp);
+            if (doc >= leafReader.maxDoc() || !hasStamp(leafReader, doc, stamp)) {
+                continue;
+            }
+            Bits liveDocs = leafReader.getLiveDocs();
+            if ((liveDocs == null || liveDocs.get(doc)) && hasIdentifier(leafReader, doc, identifierBytes)) {
+                return leaves.get(i).docBase + doc;
+            }
+            return UNKNOWN;
+        }
+        return UNKNOWN;
+    }
+
+    private void put(long hash, long stamp) {
+        int slot = slot(hash);
+        if (this.hashes[slot] == 0) {
+            this.hashes[slot] = hash;
+            this.size++;
+        }
+        this.stamps[slot] = stamp;
+        if (this.size > this.hashes.length * LOAD_FACTOR) {
+            grow();
+        }
+    }
+
+    private int slot(long hash) {
+        int mask = this.hashes.length - 1;
+        int slot = (int) (hash ^ (hash >>> 32)) & mask;
+        while (this.hashes[slot] != 0 && this.hashes[slot] != hash) {
+            slot = (slot + 1) & mask;
+        }
+        return slot;
+    }
+
+    private void grow() {
+        long[] oldHashes = this.hashes;
+        long[] oldStamps = this.stamps;
+        this.hashes = new long[oldHashes.length * 2];
+        this.stamps = new long[oldStamps.length * 2];
+        for (int i = 0; i < oldHashes.length; i++) {
+            if (oldHashes[i] != 0) {
+                int slot = slot(oldHashes[i]);
+                this.hashes[slot] = oldHashes[i];
+                this.stamps[slot] = oldStamps[i];
+            }
+        }
+    }
+
+    private static long hash(BytesRef identifier) {
+        long hash = ((long) StringHelper.murmurhash3_x86_32(identifier, 0x9747b28c) << 32) | (StringHelper.murmurhash3_x86_32(identifier, 0x5bd1e995) & 0xffffffffL);
+        return hash == 0 ? 1 : hash;
+    }
+
+    private static boolean hasStamp(LeafReader reader, int doc, long stamp) throws IOException {
+        NumericDocValues stamps = reader.getNumericDocValues(NUMERIC_STAMP_FIELD);
+        return stamps != null && stamps.advanceExact(doc) && stamps.longValue() == stamp;
+    }
+
+    private static boolean hasIdentifier(LeafReader reader, int doc, BytesRef identifier) throws IOException {
+        BinaryDocValues identifiers = reader.getBinaryDocValues(IDENTIFIER_FIELD);
+        return identifiers != null && identifiers.advanceExact(doc) && identifiers.binaryValue().bytesEquals(identifier);
+    }
+}
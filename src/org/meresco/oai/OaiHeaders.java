@@ -0,0 +1,185 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+import org.apache.lucene.index.BinaryDocValues;
+import org.apache.lucene.index.IndexReader;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.LeafReaderContext;
+import org.apache.lucene.index.NumericDocValues;
+import org.apache.lucene.index.ReaderUtil;
+import org.apache.lucene.index.SortedSetDocValues;
+import org.apache.lucene.search.ScoreDoc;
+import org.apache.lucene.util.BytesRef;
+
+
+/**
+ * The headers of a batch of records packed in flat arrays, so they cross the
+ * JCC boundary in a few calls instead of several per record.
+ *
+ * Record i has identifier bytes identifiers[identifierOffsets[i]:identifierOffsets[i + 1]]
+ * and, for every field f in VALUE_FIELDS, the values terms[ords[j]] for j in
+ * ordOffsets[i * VALUE_FIELDS.length + f] to ordOffsets[i * VALUE_FIELDS.length + f + 1].
+ */
+public class OaiHeaders {
+    public static final String[] VALUE_FIELDS = {"prefix", "prefixdeleted", "sets", "setsdeleted"};
+    private static final String IDENTIFIER_FIELD = "identifier";
+    private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private static final String TOMBSTONE_FIELD = "tombstone";
+
+    public final int size;
+    public final long[] stamps;
+    public final boolean[] tombstones;
+    public final byte[] identifiers;
+    public final int[] identifierOffsets;
+    public final String[] terms;
+    public final int[] ords;
+    public final int[] ordOffsets;
+
+    private final Map<String, Integer> termOrds = new HashMap<>();
+    private final List<String> termList = new ArrayList<>();
+
+    public OaiHeaders(IndexReader reader, ScoreDoc[] hits) throws IOException {
+        this.size = hits.length;
+        this.stamps = new long[this.size];
+        this.tombstones = new boolean[this.size];
+        byte[][] identifiers = new byte[this.size][];
+        int[][] values = new int[this.size * VALUE_FIELDS.length][];
+
+        // Doc values iterate forward only: visit the hits in docId order, which
+        // is leaf order and ascending within each leaf.
+        Integer[] order = new Integer[this.size];
+        for (int i=0; i<this.size; i++) {
+            order[i] = i;
+        }
+        Arrays.sort(order, (a, b) -> Integer.compare(hits[a].doc, hits[b].doc));
+
+        List<LeafReaderContext> leaves = reader.leaves();
+        int leafIndex = -1;
+        LeafValues leafValues = null;
+        for (int i : order) {
+            int doc = hits[i].doc;
+            int subIndex = ReaderUtil.subIndex(doc, leaves);
+            if (subIndex != leafIndex) {
+                leafIndex = subIndex;
+                leafValues = new LeafValues(leaves.get(leafIndex));
+            }
+            int leafDoc = doc - leafValues.docBase;
+            if (leafValues.stamps.advanceExact(leafDoc)) {
+                this.stamps[i] = leafValues.stamps.longValue();
+            }
+            this.tombstones[i] = leafValues.tombstones != null && leafValues.tombstones.advanceExact(leafDoc);
+            identifiers[i] = new byte[0];
+            if (leafValues.identifiers != null && leafValues.identifiers.advanceExact(leafDoc)) {
+                BytesRef identifier = leafValues.identifiers.binaryValue();
+                identifiers[i] = Arrays.copyOfRange(identifier.bytes, identifier.offset, identifier.offset + identifier.length);
+            }
+            for (int f=0; f<VALUE_FIELDS.length; f++) {
+                values[i * VALUE_FIELDS.length + f] = leafValues.ords(f, leafDoc);
+            }
+        }
+
+        this.identifierOffsets = new int[this.size + 1];
+        for (int i=0; i<this.size; i++) {
+            this.identifierOffsets[i + 1] = this.identifierOffsets[i] + identifiers[i].length;
+        }
+        this.identifiers = new byte[this.identifierOffsets[this.size]];
+        for (int i=0; i<this.size; i++) {
+            System.arraycopy(identifiers[i], 0, this.identifiers, this.identifierOffsets[i], identifiers[i].length);
+        }
+
+        this.ordOffsets = new int[values.length + 1];
+        for (int j=0; j<values.length; j++) {
+            this.ordOffsets[j + 1] = this.ordOffsets[j] + values[j].length;
+        }
+        this.ords = new int[this.ordOffsets[values.length]];
+        for (int j=0; j<values.length; j++) {
+            System.arraycopy(values[j], 0, this.ords, this.ordOffsets[j], values[j].length);
+        }
+        this.terms = this.termList.toArray(new String[0]);
+    }
+
+    private int termOrd(String term) {
+        Integer ord = this.termOrds.get(term);
+        if (ord == null) {
+            ord = this.termList.size();
+            this.termList.add(term);
+            this.termOrds.put(term, ord);
+        }
+        return ord;
+    }
+
+    private class LeafValues {
+        final int docBase;
+        final NumericDocValues stamps;
+        final NumericDocValues tombstones;
+        final BinaryDocValues identifiers;
+        final SortedSetDocValues[] values = new SortedSetDocValues[VALUE_FIELDS.length];
+        final List<Map<Long, Integer>> leafOrdToTermOrd = new ArrayList<>();
+
+        LeafValues(LeafReaderContext context) throws IOException {
+            LeafReader reader = context.reader();
+            this.docBase = context.docBase;
+            this.stamps = reader.getNumericDocValues(NUMERIC_STAMP_FIELD);
+            this.tombstones = reader.getNumericDocValues(TOMBSTONE_FIELD);
+            this.identifiers = reader.getBinaryDocValues(IDENTIFIER_FIELD);
+            for (int f=0; f<VALUE_FIELDS.length; f++) {
+                this.values[f] = reader.getSortedSetDocValues(VALUE_FIELDS[f]);
+                this.leafOrdToTermOrd.add(new HashMap<Long, Integer>());
+            }
+        }
+
+        int[] ords(int field, int leafDoc) throws IOException {
+            SortedSetDocValues docValues = this.values[field];
+            if (docValues == null || !docValues.advanceExact(leafDoc)) {
+                return new int[0];
+            }
+            Map<Long, Integer> termOrdCache = this.leafOrdToTermOrd.get(field);
+            List<Integer> result = new ArrayList<>();
+            for (long ord = docValues.nextOrd(); ord != SortedSetDocValues.NO_MORE_ORDS; ord = docValues.nextOrd()) {
+                Integer termOrd = termOrdCache.get(ord);
+                if (termOrd == null) {
+                    termOrd = termOrd(docValues.lookupOrd(ord).utf8ToString());
+                    termOrdCache.put(ord, termOrd);
+                }
+                result.add(termOrd);
+            }
+            int[] ords = new int[result.size()];
+            for (int j=0; j<ords.length; j++) {
+                ords[j] = result.get(j);
+            }
+            return ords;
+        }
+    }
+}
@@ -0,0 +1,78 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.util.HashSet;
+import java.util.Set;
+import java.util.concurrent.ExecutorService;
+
+import org.apache.lucene.index.IndexReader;
+import org.apache.lucene.index.LeafReaderContext;
+import org.apache.lucene.search.IndexSearcher;
+import org.apache.lucene.search.SearcherFactory;
+
+
+/**
+ * Searchers for OaiJazz. Optionally warms the segments a reopened reader
+ * does not share with the previous one before the SearcherManager hands
+ * out its searcher, and searches slices concurrently with an executor.
+ */
+public class OaiSearcherFactory extends SearcherFactory {
+    private final boolean warmSegments;
+    private final ExecutorService executor;
+
+    public OaiSearcherFactory(boolean warmSegments, ExecutorService executor) {
+        this.warmSegments = warmSegments;
+        this.executor = executor;
+    }
+
+    @Override
+    public IndexSearcher newSearcher(IndexReader reader, IndexReader previousReader) throws IOException {
+        if (this.warmSegments) {
+            warm(reader, previousReader);
+        }
+        return new IndexSearcher(reader, this.executor);
+    }
+
+    private static void warm(IndexReader reader, IndexReader previousReader) throws IOException {
+        Set<IndexReader.CacheKey> previousCores = new HashSet<>();
+        if (previousReader != null) {
+            for (LeafReaderContext context : previousReader.leaves()) {
+                IndexReader.CacheHelper cacheHelper = context.reader().getCoreCacheHelper();
+                if (cacheHelper != null) {
+                    previousCores.add(cacheHelper.getKey());
+                }
+            }
+        }
+        for (LeafReaderContext context : reader.leaves()) {
+            IndexReader.CacheHelper cacheHelper = context.reader().getCoreCacheHelper();
+            if (cacheHelper == null || !previousCores.contains(cacheHelper.getKey())) {
+                SegmentWarmer.warmSegment(context.reader());
+            }
+        }
+    }
+}
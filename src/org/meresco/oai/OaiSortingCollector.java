@@ -33,6 +33,7 @@
 package org.meresco.oai;
 
 import java.io.IOException;
+import java.util.Collection;
 import java.util.HashSet;
 import java.util.Set;
 
@@ -49,11 +50,14 @@ import org.apache.lucene.search.ScoreMode;
 import org.apache.lucene.search.SimpleCollector;
 import org.apache.lucene.search.Sort;
 import org.apache.lucene.search.SortField;
+import org.apache.lucene.search.TopDocs;
 import org.apache.lucene.search.TopFieldCollector;
+import org.apache.lucene.search.TopFieldDocs;
 
 
 public class OaiSortingCollector extends SimpleCollector {
     private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private static final Sort STAMP_SORT = new Sort(new SortField(NUMERIC_STAMP_FIELD, SortField.Type.LONG));
     private int hitCount = 0;
     private boolean shouldCountHits;
     private boolean delegateTerminated = false;
@@ -64,11 +68,14 @@ public class OaiSortingCollector extends SimpleCollector {
     private NumericDocValues stamps;
     private long start;
     private long stop;
+    private long maxCountedStamp = Long.MIN_VALUE;
+    private String prefix;
+    private ScoreDoc[] hits;
 
     public OaiSortingCollector(int maxDocsToCollect, boolean shouldCountHits, long start, long stop) throws IOException {
         super();
         this.topDocsCollector = TopFieldCollector.create(
-                new Sort(new SortField(NUMERIC_STAMP_FIELD, SortField.Type.LONG)),
+                STAMP_SORT,
                 maxDocsToCollect,
                 maxDocsToCollect);
         this.maxDocsToCollect = maxDocsToCollect;
@@ -77,8 +84,33 @@ public class OaiSortingCollector extends SimpleCollector {
         this.stop = stop;
     }
 
+    public void setPrefix(String prefix) {
+        this.prefix = prefix;
+    }
+
+    /**
+     * Combines the collectors of the slices of a concurrent search: the
+     * top maxDocsToCollect of their hits and the sum of their hit counts.
+     */
+    public static OaiSortingCollector merge(Collection<OaiSortingCollector> collectors) throws IOException {
+        OaiSortingCollector first = collectors.iterator().next();
+        OaiSortingCollector merged = new OaiSortingCollector(first.maxDocsToCollect, first.shouldCountHits, first.start, first.stop);
+        TopFieldDocs[] topDocs = new TopFieldDocs[collectors.size()];
+        int i = 0;
+        for (OaiSortingCollector collector : collectors) {
+            topDocs[i++] = collector.topDocsCollector.topDocs();
+            merged.hitCount += collector.hitCount;
+            merged.moreRecordsAvailable |= collector.moreRecordsAvailable;
+        }
+        if (merged.hitCount > merged.maxDocsToCollect) {
+            merged.moreRecordsAvailable = true;
+        }
+        merged.hits = TopDocs.merge(STAMP_SORT, merged.maxDocsToCollect, topDocs).scoreDocs;
+        return merged;
+    }
+
     public Document[] docs(IndexSearcher searcher) throws IOException {
-        ScoreDoc[] hits = this.topDocsCollector.topDocs().scoreDocs;
+        ScoreDoc[] hits = this.hits();
         Document[] docs = new Document[hits.length];
         for (int i=0; i<hits.length; i++) {
             docs[i] = searcher.doc(hits[i].doc);
@@ -86,6 +118,17 @@ public class OaiSortingCollector extends SimpleCollector {
         return docs;
     }
 
+    public OaiHeaders headers(IndexSearcher searcher) throws IOException {
+        return new OaiHeaders(searcher.getIndexReader(), this.hits());
+    }
+
+    private ScoreDoc[] hits() {
+        if (this.hits == null) {
+            this.hits = this.topDocsCollector.topDocs().scoreDocs;
+        }
+        return this.hits;
+    }
+
     public int remainingRecords() {
         if (this.shouldCountHits) {
             return Math.max(0, this.hitCount - this.maxDocsToCollect);
@@ -106,6 +149,9 @@ public class OaiSortingCollector extends SimpleCollector {
         if (stamp > this.stop)
             throw new CollectionTerminatedException();
         this.hitCount++;
+        if (stamp > this.maxCountedStamp) {
+            this.maxCountedStamp = stamp;
+        }
         if (this.hitCount > this.maxDocsToCollect) {
             this.moreRecordsAvailable = true;
         }
@@ -136,18 +182,16 @@ public class OaiSortingCollector extends SimpleCollector {
     @Override
     protected void doSetNextReader(LeafReaderContext context) throws IOException {
         LeafReader reader = context.reader();
-        this.stamps = reader.getNumericDocValues("numeric_stamp");
-
-        // first
-        this.stamps.advanceExact(0);
-        long firstStamp = this.stamps.longValue();
-
-        // last
-        this.stamps.advanceExact(reader.maxDoc() - 1);
-        long lastStamp = this.stamps.longValue();
-
-        if (lastStamp < this.start || this.stop < firstStamp)
+        SegmentStamps segmentStamps = SegmentStamps.get(reader);
+        if (!segmentStamps.overlaps(this.start, this.stop))
+            throw new CollectionTerminatedException();
+        if (this.prefix != null && segmentStamps.docCount(this.prefix) == 0)
+            throw new CollectionTerminatedException();
+        // A full batch with more records available: segments after the
+        // counted stamps can change neither.
+        if (!this.shouldCountHits && this.moreRecordsAvailable && segmentStamps.firstStamp > this.maxCountedStamp)
             throw new CollectionTerminatedException();
+        this.stamps = reader.getNumericDocValues(NUMERIC_STAMP_FIELD);
         this.delegateTerminated = false;
         this.earlyLeafCollector = this.topDocsCollector.getLeafCollector(context);
     }
@@ -0,0 +1,67 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.util.Collection;
+
+import org.apache.lucene.search.CollectorManager;
+
+
+/**
+ * Runs an OaiSortingCollector per slice of an IndexSearcher with an
+ * executor and merges them.
+ */
+public class OaiSortingCollectorManager implements CollectorManager<OaiSortingCollector, OaiSortingCollector> {
+    private final int maxDocsToCollect;
+    private final boolean shouldCountHits;
+    private final long start;
+    private final long stop;
+    private String prefix;
+
+    public OaiSortingCollectorManager(int maxDocsToCollect, boolean shouldCountHits, long start, long stop) {
+        this.maxDocsToCollect = maxDocsToCollect;
+        this.shouldCountHits = shouldCountHits;
+        this.start = start;
+        this.stop = stop;
+    }
+
+    public void setPrefix(String prefix) {
+        this.prefix = prefix;
+    }
+
+    @Override
+    public OaiSortingCollector newCollector() throws IOException {
+        OaiSortingCollector collector = new OaiSortingCollector(this.maxDocsToCollect, this.shouldCountHits, this.start, this.stop);
+        collector.setPrefix(this.prefix);
+        return collector;
+    }
+
+    @Override
+    public OaiSortingCollector reduce(Collection<OaiSortingCollector> collectors) throws IOException {
+        return OaiSortingCollector.merge(collectors);
+    }
+}
@@ -0,0 +1,106 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.util.HashMap;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+
+import org.apache.lucene.index.IndexReader;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.NumericDocValues;
+import org.apache.lucene.index.Terms;
+import org.apache.lucene.index.TermsEnum;
+import org.apache.lucene.util.BytesRef;
+
+
+/**
+ * First and last stamp and the number of documents per prefix of a segment.
+ *
+ * Documents in a segment never change, only their deletion state does, so
+ * these are cached per segment core and dropped when the core is closed.
+ * Document counts include deleted documents.
+ */
+public class SegmentStamps {
+    private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private static final String PREFIX_FIELD = "prefix";
+    private static final Map<IndexReader.CacheKey, SegmentStamps> cache = new ConcurrentHashMap<>();
+
+    public final int maxDoc;
+    public final long firstStamp;
+    public final long lastStamp;
+    private final Map<String, Integer> prefixDocCounts = new HashMap<>();
+
+    private SegmentStamps(LeafReader reader) throws IOException {
+        this.maxDoc = reader.maxDoc();
+        this.firstStamp = this.maxDoc > 0 ? stampOf(reader, 0) : Long.MAX_VALUE;
+        this.lastStamp = this.maxDoc > 0 ? stampOf(reader, this.maxDoc - 1) : Long.MIN_VALUE;
+        Terms prefixes = reader.terms(PREFIX_FIELD);
+        if (prefixes != null) {
+            TermsEnum termsEnum = prefixes.iterator();
+            for (BytesRef term = termsEnum.next(); term != null; term = termsEnum.next()) {
+                this.prefixDocCounts.put(term.utf8ToString(), termsEnum.docFreq());
+            }
+        }
+    }
+
+    public static SegmentStamps get(LeafReader reader) throws IOException {
+        IndexReader.CacheHelper cacheHelper = reader.getCoreCacheHelper();
+        if (cacheHelper == null) {
+            return new SegmentStamps(reader);
+        }
+        IndexReader.CacheKey key = cacheHelper.getKey();
+        SegmentStamps segmentStamps = cache.get(key);
+        if (segmentStamps == null) {
+            segmentStamps = new SegmentStamps(reader);
+            if (cache.putIfAbsent(key, segmentStamps) == null) {
+                cacheHelper.addClosedListener(cache::remove);
+            }
+        }
+        return segmentStamps;
+    }
+
+    public static int cacheSize() {
+        return cache.size();
+    }
+
+    public boolean overlaps(long start, long stop) {
+        return this.maxDoc > 0 && start <= this.lastStamp && this.firstStamp <= stop;
+    }
+
+    public int docCount(String prefix) {
+        return this.prefixDocCounts.getOrDefault(prefix, 0);
+    }
+
+    private static long stampOf(LeafReader reader, int doc) throws IOException {
+        NumericDocValues stamps = reader.getNumericDocValues(NUMERIC_STAMP_FIELD);
+        if (stamps == null || !stamps.advanceExact(doc)) {
+            return doc == 0 ? Long.MIN_VALUE : Long.MAX_VALUE;
+        }
+        return stamps.longValue();
+    }
+}
@@ -0,0 +1,121 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+
+import org.apache.lucene.index.BinaryDocValues;
+import org.apache.lucene.index.IndexWriter;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.NumericDocValues;
+import org.apache.lucene.index.SortedSetDocValues;
+import org.apache.lucene.index.Term;
+import org.apache.lucene.index.Terms;
+import org.apache.lucene.index.TermsEnum;
+import org.apache.lucene.search.DocIdSetIterator;
+import org.apache.lucene.util.BytesRef;
+
+
+/**
+ * Reads what harvesting needs from a new segment before it is searched:
+ * the doc values OaiHeaders reads, the prefix and set term dictionaries,
+ * SegmentStamps and the TermBitSets of the prefixes and tombstones.
+ *
+ * Used by IndexWriter for merged segments and by OaiSearcherFactory
+ * for the segments of a reopened reader.
+ */
+public class SegmentWarmer implements IndexWriter.IndexReaderWarmer {
+    private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private static final String IDENTIFIER_FIELD = "identifier";
+    private static final String PREFIX_FIELD = "prefix";
+    private static final String SETS_FIELD = "sets";
+    private static final String TOMBSTONE_FIELD = "tombstone";
+    private static final String TOMBSTONE_VALUE = "T";
+
+    @Override
+    public void warm(LeafReader reader) throws IOException {
+        warmSegment(reader);
+    }
+
+    public static void warmSegment(LeafReader reader) throws IOException {
+        if (reader.maxDoc() == 0) {
+            return;
+        }
+        SegmentStamps.get(reader);
+        warmNumeric(reader.getNumericDocValues(NUMERIC_STAMP_FIELD));
+        warmNumeric(reader.getNumericDocValues(TOMBSTONE_FIELD));
+        warmBinary(reader.getBinaryDocValues(IDENTIFIER_FIELD));
+        for (String field : OaiHeaders.VALUE_FIELDS) {
+            warmSortedSet(reader.getSortedSetDocValues(field));
+        }
+        Terms prefixes = reader.terms(PREFIX_FIELD);
+        if (prefixes != null) {
+            TermsEnum termsEnum = prefixes.iterator();
+            for (BytesRef term = termsEnum.next(); term != null; term = termsEnum.next()) {
+                TermBitSets.get(reader, new Term(PREFIX_FIELD, BytesRef.deepCopyOf(term)));
+            }
+        }
+        Terms sets = reader.terms(SETS_FIELD);
+        if (sets != null) {
+            TermsEnum termsEnum = sets.iterator();
+            while (termsEnum.next() != null) {
+                termsEnum.docFreq();
+            }
+        }
+        TermBitSets.get(reader, new Term(TOMBSTONE_FIELD, TOMBSTONE_VALUE));
+    }
+
+    private static void warmNumeric(NumericDocValues values) throws IOException {
+        if (values == null) {
+            return;
+        }
+        while (values.nextDoc() != DocIdSetIterator.NO_MORE_DOCS) {
+            values.longValue();
+        }
+    }
+
+    private static void warmBinary(BinaryDocValues values) throws IOException {
+        if (values == null) {
+            return;
+        }
+        while (values.nextDoc() != DocIdSetIterator.NO_MORE_DOCS) {
+            values.binaryValue();
+        }
+    }
+
+    private static void warmSortedSet(SortedSetDocValues values) throws IOException {
+        if (values == null) {
+            return;
+        }
+        while (values.nextDoc() != DocIdSetIterator.NO_MORE_DOCS) {
+            while (values.nextOrd() != SortedSetDocValues.NO_MORE_ORDS) {
+            }
+        }
+        for (long ord = 0; ord < values.getValueCount(); ord++) {
+            values.lookupOrd(ord);
+        }
+    }
+}
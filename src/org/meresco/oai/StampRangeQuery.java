@@ -0,0 +1,149 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+
+import org.apache.lucene.index.DocValues;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.LeafReaderContext;
+import org.apache.lucene.index.NumericDocValues;
+import org.apache.lucene.search.ConstantScoreScorer;
+import org.apache.lucene.search.ConstantScoreWeight;
+import org.apache.lucene.search.DocIdSetIterator;
+import org.apache.lucene.search.IndexSearcher;
+import org.apache.lucene.search.Query;
+import org.apache.lucene.search.QueryVisitor;
+import org.apache.lucene.search.ScoreMode;
+import org.apache.lucene.search.Scorer;
+import org.apache.lucene.search.Sort;
+import org.apache.lucene.search.SortField;
+import org.apache.lucene.search.Weight;
+
+
+/**
+ * Matches documents with start <= stamp <= stop.
+ *
+ * The index is sorted on stamp, so in every segment the matching documents
+ * form one contiguous range of docIds. Its bounds are found with a binary
+ * search over the stamp doc values, and the range is returned as iterator so
+ * a conjunction can advance straight to the first matching document.
+ */
+public class StampRangeQuery extends Query {
+    private static final String NUMERIC_STAMP_FIELD = "numeric_stamp";
+    private final long start;
+    private final long stop;
+
+    public StampRangeQuery(long start, long stop) {
+        this.start = start;
+        this.stop = stop;
+    }
+
+    @Override
+    public Weight createWeight(IndexSearcher searcher, ScoreMode scoreMode, float boost) throws IOException {
+        return new ConstantScoreWeight(this, boost) {
+            @Override
+            public Scorer scorer(LeafReaderContext context) throws IOException {
+                LeafReader reader = context.reader();
+                if (!SegmentStamps.get(reader).overlaps(start, stop)) {
+                    return null;
+                }
+                int from = 0;
+                int to = reader.maxDoc();
+                if (isSortedOnStamp(reader)) {
+                    from = firstDocAtOrAfter(reader, start);
+                    if (stop != Long.MAX_VALUE) {
+                        to = firstDocAtOrAfter(reader, stop + 1);
+                    }
+                }
+                if (from >= to) {
+                    return null;
+                }
+                return new ConstantScoreScorer(this, score(), scoreMode, DocIdSetIterator.range(from, to));
+            }
+
+            @Override
+            public boolean isCacheable(LeafReaderContext context) {
+                return DocValues.isCacheable(context, NUMERIC_STAMP_FIELD);
+            }
+        };
+    }
+
+    public static int firstDocAtOrAfter(LeafReader reader, long stamp) throws IOException {
+        int low = 0;
+        int high = reader.maxDoc();
+        while (low < high) {
+            int middle = (low + high) >>> 1;
+            if (stampOf(reader, middle) < stamp) {
+                low = middle + 1;
+            } else {
+                high = middle;
+            }
+        }
+        return low;
+    }
+
+    private static long stampOf(LeafReader reader, int doc) throws IOException {
+        NumericDocValues stamps = reader.getNumericDocValues(NUMERIC_STAMP_FIELD);
+        if (stamps == null || !stamps.advanceExact(doc)) {
+            return Long.MIN_VALUE;
+        }
+        return stamps.longValue();
+    }
+
+    private static boolean isSortedOnStamp(LeafReader reader) {
+        Sort sort = reader.getMetaData().getSort();
+        if (sort == null) {
+            return false;
+        }
+        SortField[] sortFields = sort.getSort();
+        return sortFields.length > 0 && NUMERIC_STAMP_FIELD.equals(sortFields[0].getField()) && !sortFields[0].getReverse();
+    }
+
+    @Override
+    public void visit(QueryVisitor visitor) {
+        if (visitor.acceptField(NUMERIC_STAMP_FIELD)) {
+            visitor.visitLeaf(this);
+        }
+    }
+
+    @Override
+    public String toString(String field) {
+        return "StampRangeQuery(" + this.start + " TO " + this.stop + ")";
+    }
+
+    @Override
+    public boolean equals(Object other) {
+        return sameClassAs(other) &&
+            this.start == ((StampRangeQuery) other).start &&
+            this.stop == ((StampRangeQuery) other).stop;
+    }
+
+    @Override
+    public int hashCode() {
+        return 31 * (31 * classHash() + Long.hashCode(this.start)) + Long.hashCode(this.stop);
+    }
+}
@@ -0,0 +1,198 @@
+/* begin license *
+ *
+ * "Meresco Oai" are components to build Oai repositories, based on
+ * "Meresco Core" and "Meresco Components".
+ *
+ * Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+ *
+ * This file is part of "Meresco Oai"
+ *
+ * "Meresco Oai" is free software; you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation; either version 2 of the License, or
+ * (at your option) any later version.
+ *
+ * "Meresco Oai" is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with "Meresco Oai"; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+ *
+ * end license */
+
+package org.meresco.oai;
+
+import java.io.IOException;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.HashSet;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Future;
+
+import org.apache.lucene.index.IndexReader;
+import org.apache.lucene.index.LeafReader;
+import org.apache.lucene.index.LeafReaderContext;
+import org.apache.lucene.index.PostingsEnum;
+import org.apache.lucene.index.Term;
+import org.apache.lucene.search.DocIdSetIterator;
+import org.apache.lucene.util.Bits;
+import org.apache.lucene.util.FixedBitSet;
+
+
+/**
+ * Per segment bitsets of the documents containing a term, to count records
+ * per prefix, set and tombstone without running a search.
+ *
+ * The bitsets ignore deletions, which are applied while counting, so they
+ * are cached per segment core and dropped when the core is closed. Only
+ * the few prefix and tombstone terms are cached; the bitsets of sets, of
+ * which there can be thousands, are built per count.
+ */
+public class TermBitSets {
+    private static final Set<String> CACHED_FIELDS = new HashSet<>(Arrays.asList("prefix", "tombstone"));
+    private static final Term TOMBSTONE_TERM = new Term("tombstone", "T");
+    private static final Map<IndexReader.CacheKey, Map<Term, FixedBitSet>> cache = new ConcurrentHashMap<>();
+
+    public static FixedBitSet get(LeafReader reader, Term term) throws IOException {
+        IndexReader.CacheHelper cacheHelper = reader.getCoreCacheHelper();
+        if (cacheHelper == null || !CACHED_FIELDS.contains(term.field())) {
+            return bitSet(reader, term);
+        }
+        IndexReader.CacheKey key = cacheHelper.getKey();
+        Map<Term, FixedBitSet> bitSets = cache.get(key);
+        if (bitSets == null) {
+            bitSets = new ConcurrentHashMap<>();
+            Map<Term, FixedBitSet> existing = cache.putIfAbsent(key, bitSets);
+            if (existing == null) {
+                cacheHelper.addClosedListener(cache::remove);
+            } else {
+                bitSets = existing;
+            }
+        }
+        FixedBitSet bitSet = bitSets.get(term);
+        if (bitSet == null) {
+            bitSet = bitSet(reader, term);
+            bitSets.put(term, bitSet);
+        }
+        return bitSet;
+    }
+
+    public static int cacheSize() {
+        return cache.size();
+    }
+
+    public static int cachedBitSets() {
+        int count = 0;
+        for (Map<Term, FixedBitSet> bitSets : cache.values()) {
+            count += bitSets.size();
+        }
+        return count;
+    }
+
+    /**
+     * Counts the live documents with start <= stamp <= stop that contain
+     * all terms fields[i]:values[i].
+     */
+    public static long count(IndexReader reader, String[] fields, String[] values, long start, long stop) throws IOException {
+        long count = 0;
+        for (LeafReaderContext context : reader.leaves()) {
+            count += countLeaf(context.reader(), fields, values, start, stop);
+        }
+        return count;
+    }
+
+    /**
+     * As count, with the segments counted concurrently by executor.
+     */
+    public static long count(IndexReader reader, String[] fields, String[] values, long start, long stop, ExecutorService executor) throws IOException {
+        List<Future<Long>> counts = new ArrayList<>();
+        for (LeafReaderContext context : reader.leaves()) {
+            counts.add(executor.submit(() -> countLeaf(context.reader(), fields, values, start, stop)));
+        }
+        long count = 0;
+        try {
+            for (Future<Long> leafCount : counts) {
+                count += leafCount.get();
+            }
+        } catch (InterruptedException | ExecutionException e) {
+            throw new IOException(e);
+        }
+        return count;
+    }
+
+    /**
+     * Counts the live documents containing term and how many of them are
+     * tombstones, from the postings of term without building its bitset.
+     */
+    public static long[] countTerm(IndexReader reader, Term term) throws IOException {
+        long[] counts = new long[2];
+        for (LeafReaderContext context : reader.leaves()) {
+            LeafReader leafReader = context.reader();
+            PostingsEnum postings = leafReader.postings(term, PostingsEnum.NONE);
+            if (postings == null) {
+                continue;
+            }
+            Bits liveDocs = leafReader.getLiveDocs();
+            FixedBitSet tombstones = get(leafReader, TOMBSTONE_TERM);
+            for (int doc = postings.nextDoc(); doc != DocIdSetIterator.NO_MORE_DOCS; doc = postings.nextDoc()) {
+                if (liveDocs == null || liveDocs.get(doc)) {
+                    counts[0]++;
+                    if (tombstones.get(doc)) {
+                        counts[1]++;
+                    }
+                }
+            }
+        }
+        return counts;
+    }
+
+    private static long countLeaf(LeafReader leafReader, String[] fields, String[] values, long start, long stop) throws IOException {
+        if (!SegmentStamps.get(leafReader).overlaps(start, stop)) {
+            return 0;
+        }
+        int from = StampRangeQuery.firstDocAtOrAfter(leafReader, start);
+        int to = stop == Long.MAX_VALUE ? leafReader.maxDoc() : StampRangeQuery.firstDocAtOrAfter(leafReader, stop + 1);
+        if (from >= to) {
+            return 0;
+        }
+        FixedBitSet matches = new FixedBitSet(leafReader.maxDoc());
+        matches.set(from, to);
+        for (int i=0; i<fields.length; i++) {
+            matches.and(get(leafReader, new Term(fields[i], values[i])));
+        }
+        return countLive(matches, leafReader.getLiveDocs());
+    }
+
+    private static long countLive(FixedBitSet matches, Bits liveDocs) {
+        if (liveDocs == null) {
+            return matches.cardinality();
+        }
+        if (liveDocs instanceof FixedBitSet) {
+            return FixedBitSet.intersectionCount(matches, (FixedBitSet) liveDocs);
+        }
+        long count = 0;
+        for (int doc = matches.nextSetBit(0); doc != DocIdSetIterator.NO_MORE_DOCS; doc = doc + 1 < matches.length() ? matches.nextSetBit(doc + 1) : DocIdSetIterator.NO_MORE_DOCS) {
+            if (liveDocs.get(doc)) {
+                count++;
+            }
+        }
+        return count;
+    }
+
+    private static FixedBitSet bitSet(LeafReader reader, Term term) throws IOException {
+        FixedBitSet bitSet = new FixedBitSet(reader.maxDoc());
+        PostingsEnum postings = reader.postings(term, PostingsEnum.NONE);
+        if (postings != null) {
+            bitSet.or(postings);
+        }
+        return bitSet;
+    }
+}
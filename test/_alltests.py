@@ -59,6 +59,7 @@ warnings.filterwarnings("ignore", category=DeprecationWarning)
 
 import seecr_initvm; seecr_initvm.initvm("meresco_lucene", "meresco_sequentialstore", "meresco_oai")
 
+from compressiontest import CompressionTest
 from fields2oairecordtest import Fields2OaiRecordTest
 from oaiaddrecordtest import OaiAddRecordTest
 from oaiaddrecordwithdefaultstest import OaiAddRecordWithDefaultsTest
@@ -79,8 +80,10 @@ from oairepositorytest import OaiRepositoryTest
 from oaisetmasktest import OaiSetMaskTest
 from oaisetselecttest import OaiSetSelectTest
 from oaitooltest import OaiToolTest
+from shardedoaijazztest import ShardedOaiJazzTest
 from streaminglxmltest import StreamingLxmlTest
 from suspendregistertest import SuspendRegisterTest
+from timebucketedoaijazztest import TimeBucketedOaiJazzTest
 
 from info.oaiinfotest import OaiInfoTest
 
@@ -0,0 +1,118 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from gzip import decompress as gunzip
+from zlib import decompress, decompressobj, MAX_WBITS
+
+from seecr.test import SeecrTestCase
+
+from weightless.core import Yield
+from meresco.components.http.utils import okXml
+
+from meresco.oai.compression import acceptedEncoding, compressResponse, GzipMember, GzipMemberCache
+
+
+class CompressionTest(SeecrTestCase):
+    def testAcceptedEncoding(self):
+        self.assertEqual(None, acceptedEncoding({}))
+        self.assertEqual(None, acceptedEncoding({'Accept-Encoding': 'identity'}))
+        self.assertEqual('gzip', acceptedEncoding({'Accept-Encoding': 'deflate, gzip'}, encodings=['gzip', 'deflate']))
+        self.assertEqual('deflate', acceptedEncoding({'accept-encoding': 'gzip;q=0, deflate;q=0.5'}, encodings=['gzip', 'deflate']))
+        self.assertEqual('gzip', acceptedEncoding({'Accept-Encoding': '*'}, encodings=['gzip', 'deflate']))
+        self.assertEqual(None, acceptedEncoding({'Accept-Encoding': 'br'}, encodings=['gzip', 'deflate']))
+
+    def testCompressResponse(self):
+        def response():
+            yield okXml
+            yield '<root>'
+            for i in range(100):
+                yield '<item>%s</item>' % i
+            yield '</root>'
+        result = b''.join(compressResponse(response(), encoding='gzip', minimumSize=100))
+        header, body = result.split(b'\r\n\r\n', 1)
+        self.assertEqual(okXml.split('\r\n\r\n')[0].encode() + b'\r\nContent-Encoding: gzip\r\nVary: Accept-Encoding', header)
+        self.assertEqual(''.join(list(response())[1:]).encode(), decompress(body, 16 + MAX_WBITS))
+
+        result = b''.join(compressResponse(response(), encoding='deflate', minimumSize=100))
+        header, body = result.split(b'\r\n\r\n', 1)
+        self.assertEqual(''.join(list(response())[1:]).encode(), decompress(body))
+
+    def testSmallResponseNotCompressed(self):
+        def response():
+            yield okXml
+            yield '<root/>'
+        self.assertEqual((okXml + '<root/>').encode(), b''.join(compressResponse(response(), encoding='gzip', minimumSize=100)))
+
+    def testNotModifiedNotCompressed(self):
+        def response():
+            yield 'HTTP/1.0 304 Not Modified\r\n\r\n'
+        self.assertEqual(b'HTTP/1.0 304 Not Modified\r\n\r\n', b''.join(compressResponse(response(), encoding='gzip', minimumSize=0)))
+
+    def testFlushesBeforeYield(self):
+        def response():
+            yield okXml
+            yield '<root>'
+            yield Yield
+            yield '</root>'
+        result = list(compressResponse(response(), encoding='gzip', minimumSize=1000))
+        self.assertTrue(Yield in result)
+        index = result.index(Yield)
+        decompressor = decompressobj(16 + MAX_WBITS)
+        self.assertEqual(b'<root>', decompressor.decompress(b''.join(result[:index]).split(b'\r\n\r\n', 1)[1]))
+        self.assertEqual(b'</root>', decompressor.decompress(b''.join(result[index + 1:])))
+
+    def testGzipMemberIncludedAsIs(self):
+        member = GzipMember('<record>cached</record>')
+        self.assertEqual('<record>cached</record>', member)
+        self.assertEqual(b'<record>cached</record>', gunzip(member.compressed))
+        def response():
+            yield okXml
+            yield '<root>'
+            yield member
+            yield '</root>'
+        result = list(compressResponse(response(), encoding='gzip', minimumSize=1000))
+        self.assertTrue(any(member.compressed in data for data in result if type(data) is bytes))
+        header, body = b''.join(result).split(b'\r\n\r\n', 1)
+        self.assertEqual(b'<root><record>cached</record></root>', gunzip(body))
+
+        header, body = b''.join(compressResponse(response(), encoding='deflate', minimumSize=0)).split(b'\r\n\r\n', 1)
+        self.assertEqual(b'<root><record>cached</record></root>', decompress(body))
+
+    def testGzipMemberCache(self):
+        size = GzipMember('<record>0</record>').size()
+        cache = GzipMemberCache(maxBytes=2 * size)
+        self.assertEqual(None, cache.get('0'))
+        member = cache.add('0', '<record>0</record>')
+        self.assertEqual(GzipMember, type(member))
+        self.assertEqual(member, cache.get('0'))
+        cache.add('1', '<record>1</record>')
+        cache.get('0')
+        cache.add('2', '<record>2</record>')
+        self.assertEqual(2, len(cache))
+        self.assertEqual(None, cache.get('1'))
+        self.assertEqual('<record>0</record>', cache.get('0'))
+        cache.add('big', '<record>%s</record>' % ('x' * 1000))
+        self.assertEqual(None, cache.get('big'))
+        self.assertEqual(2, len(cache))
@@ -32,6 +32,7 @@ from seecr.test import SeecrTestCase
 
 from meresco.oai import OaiJazz
 from json import loads
+import gzip
 from os.path import join, dirname, abspath
 from time import time
 
@@ -122,6 +123,74 @@ class OaiExportTest(SeecrTestCase):
             'deletedSets': [],
             'sets': [],}, record7)
 
+    def testExportInBatchesGzipped(self):
+        jazz = OaiJazz(join(self.tempdir, 'oai'), deleteInSets=True)
+        jazz.updateMetadataFormat(prefix='prefix', schema='schema', namespace='namespace')
+        for i in range(25):
+            jazz.addOaiRecord(identifier='id:{}'.format(i), metadataPrefixes=['prefix'], setSpecs=['set{}'.format(i % 2)])
+        jazz.deleteOaiRecord(identifier='id:3')
+        plainfile = join(self.tempdir, 'plain.dump')
+        jazz.export(plainfile)
+        progress = []
+        dumpfile = join(self.tempdir, 'dump.gz')
+        jazz.export(dumpfile, batchSize=4, exportThreads=3, progress=progress.append)
+        jazz.close()
+
+        self.assertEqual([4, 8, 12, 16, 20, 24, 25], progress)
+        with open(plainfile, 'rb') as fp:
+            plain = fp.read()
+        with gzip.open(dumpfile) as fp:
+            self.assertEqual(plain, fp.read())
+        self.assertEqual('id:3', loads(plain.strip().split(b'\n')[-1])['identifier'])
+
+        self.assertTrue(OaiJazz.importDump(join(self.tempdir, 'imported'), dumpfile))
+        jazz = OaiJazz(join(self.tempdir, 'imported'), deleteInSets=True)
+        records = list(jazz.oaiSelect(prefix='prefix', batchSize=100).records)
+        self.assertEqual(25, len(records))
+        self.assertEqual('id:3', records[-1].identifier)
+        self.assertTrue(records[-1].isDeleted)
+        jazz.close()
+
+    def testImportDumpInBatches(self):
+        jazz = OaiJazz(join(self.tempdir, 'oai'), deleteInSets=True)
+        jazz.updateMetadataFormat(prefix='prefix', schema='schema', namespace='namespace')
+        for i in range(25):
+            jazz.addOaiRecord(identifier='id:{}'.format(i), metadataPrefixes=['prefix'], setSpecs=['set{}'.format(i % 2)])
+        jazz.deleteOaiRecord(identifier='id:3')
+        dumpfile = join(self.tempdir, 'dump')
+        jazz.export(dumpfile)
+        jazz.close()
+
+        progress = []
+        self.assertTrue(OaiJazz.importDump(join(self.tempdir, 'imported'), dumpfile, batchSize=4, importThreads=2, progress=progress.append))
+        self.assertEqual([4, 8, 12, 16, 20, 24, 25], progress)
+        jazz = OaiJazz(join(self.tempdir, 'imported'), deleteInSets=True)
+        self.assertEqual({'total': 25, 'deletes': 1}, jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual({'total': 13, 'deletes': 0}, jazz.getNrOfRecords(prefix='prefix', setSpec='set0'))
+        reimported = join(self.tempdir, 'reimported')
+        jazz.export(reimported)
+        jazz.close()
+        with open(dumpfile) as fp, open(reimported) as reimportedFp:
+            self.assertEqual(fp.read(), reimportedFp.read())
+
+        self.assertRaises(ValueError, lambda: OaiJazz.importDump(join(self.tempdir, 'imported'), dumpfile))
+
+    def testImportDumpSavesCounters(self):
+        rebuilds = []
+        class CountingOaiJazz(OaiJazz):
+            def _rebuildCounters(self):
+                rebuilds.append(self._directory)
+                OaiJazz._rebuildCounters(self)
+
+        dumpfile = join(datadir, 'oaiexport.dump')
+        directory = join(self.tempdir, 'oai')
+        self.assertTrue(OaiJazz.importDump(directory, dumpfile))
+        jazz = CountingOaiJazz(directory, deleteInSets=True)
+        self.assertEqual([], rebuilds)
+        self.assertEqual({'total': 7, 'deletes': 1}, jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual('2019-12-10T10:22:29Z', jazz.getRecord('id:7').getDatestamp())
+        jazz.close()
+
     def testOaiJazzImport(self):
         dumpfile = join(datadir, 'oaiexport.dump')
         result = OaiJazz.importDump(join(self.tempdir, 'oai'), dumpfile)
@@ -47,6 +47,7 @@ from time import time, sleep
 from traceback import print_exc
 from calendar import timegm
 from io import StringIO
+from json import load, dump
 
 from lxml.etree import parse
 
@@ -56,8 +57,10 @@ from seecr.test.io import stderr_replaced, stdout_replaced
 from weightless.core import be, compose, consume
 from meresco.core import Observable, Transparent
 
-from org.apache.lucene.document import Document, LongPoint, Field, StoredField, NumericDocValuesField, StringField
-from org.apache.lucene.index import Term
+from org.apache.lucene.document import Document, LongPoint, Field, StoredField, NumericDocValuesField, StringField, BinaryDocValuesField, SortedSetDocValuesField
+from org.apache.lucene.index import Term, LogByteSizeMergePolicy, ConcurrentMergeScheduler
+from org.apache.lucene.util import BytesRef
+from org.meresco.oai import SegmentStamps, TermBitSets
 
 from meresco.oai import OaiJazz, OaiAddRecord, allHierarchicalSetSpecs
 import meresco.oai.oaijazz as jazzModule
@@ -505,6 +508,105 @@ class OaiJazzTest(SeecrTestCase):
         self.assertEqual({'deletes': 0, 'total': 1}, self.jazz.getNrOfRecords(prefix='aPrefix', partition=Partition.create('1/2')))
         self.assertEqual({'deletes': 1, 'total': 1}, self.jazz.getNrOfRecords(prefix='aPrefix', partition=Partition.create('2/2')))
 
+    def testGetNrOfRecordsOverSegments(self):
+        for i in range(1, 21):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['even'] if i % 2 == 0 else [])
+            if i % 5 == 0:
+                self.jazz.commit()
+        stamp = self.jazz.getRecord('id:10').stamp
+        for i in range(1, 5):
+            list(compose(self.jazz.delete('id:%s' % i)))
+        self.jazz.addOaiRecord('id:5', metadataPrefixes=['prefix'], setSpecs=['even'])
+        self.assertEqual({'total': 20, 'deletes': 4}, self.jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual({'total': 11, 'deletes': 2}, self.jazz.getNrOfRecords(prefix='prefix', setSpec='even'))
+        self.assertEqual({'total': 15, 'deletes': 4}, self.jazz.getNrOfRecords(prefix='prefix', continueAfter=str(stamp)))
+        self.assertEqual({'total': 8, 'deletes': 2}, self.jazz.getNrOfRecords(prefix='prefix', setSpec='even', continueAfter=str(stamp)))
+        self.assertEqual({'total': 0, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='other'))
+        self.assertTrue(TermBitSets.cacheSize() > 0)
+
+    def testOnlyPrefixAndTombstoneBitSetsCached(self):
+        for i in range(20):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['set%s' % i])
+        self.jazz.commit()
+        self.jazz.getNrOfRecords(prefix='prefix', setSpec='set0')
+        cachedBitSets = TermBitSets.cachedBitSets()
+        for i in range(20):
+            self.assertEqual({'total': 1, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='prefix', setSpec='set%s' % i))
+        self.assertEqual(cachedBitSets, TermBitSets.cachedBitSets())
+
+    def testGetNrOfRecordsFromCounters(self):
+        jazz = OaiJazz(self.tmpdir2("b"), persistentDelete=False)
+        jazz.addOaiRecord('id:1', metadataPrefixes=['A'], setSpecs=['one:two'])
+        jazz.addOaiRecords([
+                dict(identifier='id:2', metadataPrefixes=['A', 'B'], setSpecs=['one']),
+                dict(identifier='id:3', metadataPrefixes=['B'], setSpecs=['three']),
+            ])
+        jazz.deleteOaiRecord('id:2')
+        jazz.deleteOaiRecords(['id:3'])
+        jazz.addOaiRecord('id:3', metadataPrefixes=['B'], setSpecs=['one'])
+        jazz.purge('id:1')
+        jazz.addOaiRecord('id:4', metadataPrefixes=['A'], setSpecs=['three'])
+        expected = jazz._counters
+        jazz._rebuildCounters()
+        self.assertEqual(expected, jazz._counters)
+        self.assertEqual({'total': 2, 'deletes': 1}, jazz.getNrOfRecords(prefix='A'))
+        self.assertEqual({'total': 2, 'deletes': 1}, jazz.getNrOfRecords(prefix=None, setSpec='one'))
+        self.assertEqual({'total': 0, 'deletes': 0}, jazz.getNrOfRecords(prefix=None, setSpec='one:two'))
+        self.assertEqual({'total': 3, 'deletes': 1}, jazz.getNrOfRecords(prefix=None))
+        jazz.purgeFromSet('three')
+        self.assertEqual({'total': 1, 'deletes': 1}, jazz.getNrOfRecords(prefix='B'))
+        self.assertEqual({'total': 1, 'deletes': 1}, jazz.getNrOfRecords(prefix='A'))
+        self.assertEqual({'total': 1, 'deletes': 1}, jazz.getNrOfRecords(prefix=None, setSpec='one'))
+        self.assertEqual({'total': 1, 'deletes': 1}, jazz.getNrOfRecords(prefix=None))
+        self.assertEqual({'total': 0, 'deletes': 0}, jazz.getNrOfRecords(prefix='C'))
+        jazz.close()
+
+    def testCountersPersistedOnCommit(self):
+        jazz = OaiJazz(self.tmpdir2("b"))
+        jazz.addOaiRecord('id:1', metadataPrefixes=['A'])
+        jazz.addOaiRecord('id:2', metadataPrefixes=['A'])
+        jazz.close()
+        countersFile = join(self.tmpdir2("b"), 'counters.json')
+        with open(countersFile) as fp:
+            data = load(fp)
+        self.assertEqual({'total': 2, 'deletes': 0}, data['counters']['prefixes']['A'])
+        data['counters']['prefixes']['A']['total'] = 42
+        with open(countersFile, 'w') as fp:
+            dump(data, fp)
+        jazz = OaiJazz(self.tmpdir2("b"))
+        self.assertEqual({'total': 42, 'deletes': 0}, jazz.getNrOfRecords(prefix='A'))
+        jazz.close()
+
+        with open(countersFile) as fp:
+            data = load(fp)
+        data['counters']['prefixes']['A']['total'] = 42
+        data['generation'] -= 1
+        with open(countersFile, 'w') as fp:
+            dump(data, fp)
+        jazz = OaiJazz(self.tmpdir2("b"))
+        self.assertEqual({'total': 2, 'deletes': 0}, jazz.getNrOfRecords(prefix='A'))
+        jazz.close()
+
+    def testCountersLoadedAfterPurgeOfNewestAndUnknownDeletes(self):
+        rebuilds = []
+        class CountingOaiJazz(OaiJazz):
+            def _rebuildCounters(self):
+                rebuilds.append(self._directory)
+                OaiJazz._rebuildCounters(self)
+        jazz = CountingOaiJazz(self.tmpdir2("b"), persistentDelete=False)
+        jazz.addOaiRecords([dict(identifier='id:%s' % i, metadataPrefixes=['A'], setSpecs=['one']) for i in range(3)])
+        jazz.deleteOaiRecords(['id:1', 'id:unknown'])
+        jazz.purge('id:2')
+        jazz.close()
+        del rebuilds[:]
+        jazz = CountingOaiJazz(self.tmpdir2("b"), persistentDelete=False)
+        self.assertEqual([], rebuilds)
+        self.assertEqual({'total': 2, 'deletes': 1}, jazz.getNrOfRecords(prefix='A'))
+        self.assertEqual({'total': 2, 'deletes': 1}, jazz.getNrOfRecords(prefix=None, setSpec='one'))
+        jazz._rebuildCounters()
+        self.assertEqual({'total': 2, 'deletes': 1}, jazz.getNrOfRecords(prefix=None))
+        jazz.close()
+
     def testMoreRecordsAvailable(self):
         self.jazz.updateMetadataFormat(prefix="aPrefix", schema="schema", namespace="namespace")
         self.jazz.updateSet(setSpec="setSpec", setName="setName")
@@ -591,6 +693,62 @@ class OaiJazzTest(SeecrTestCase):
         except AssertionError as e:
             self.assertEqual("The OAI index at %s is not compatible with this version (no conversion script could be provided)." % self.tmpdir2("a"), str(e))
 
+    @stdout_replaced
+    def testUpgradeFromVersion12(self):
+        self.jazz.close()
+        self.jazz = None
+        jazz = OaiJazz(self.tmpdir2("b"))
+        for identifier, stamp, prefixes, sets, tombstone in [('id:1', 1000, ['A'], ['one'], False), ('id:2', 1001, ['A', 'B'], [], True)]:
+            doc = Document()
+            doc.add(StringField("identifier", identifier, Field.Store.YES))
+            doc.add(StoredField("stamp", BytesRef(jazzModule.JArray('byte')(jazzModule.int_to_bytes(stamp)))))
+            doc.add(LongPoint("stamp", stamp))
+            doc.add(NumericDocValuesField("numeric_stamp", stamp))
+            for prefix in prefixes:
+                doc.add(StringField("prefix", prefix, Field.Store.YES))
+            for setSpec in sets:
+                doc.add(StringField("sets", setSpec, Field.Store.YES))
+            if tombstone:
+                doc.add(StringField("prefixdeleted", "B", Field.Store.YES))
+                doc.add(StringField("tombstone", "T", Field.Store.YES))
+            jazz._writer.updateDocument(Term("identifier", identifier), doc)
+        jazz.close()
+        with open(join(self.tmpdir2("b"), 'oai.version'), 'w') as fp:
+            fp.write('12')
+
+        jazz = OaiJazz(self.tmpdir2("b"))
+        with open(join(self.tmpdir2("b"), 'oai.version')) as fp:
+            self.assertEqual(OaiJazz.version, fp.read())
+        records = list(jazz.oaiSelect(prefix='A').records)
+        self.assertEqual(['id:1', 'id:2'], [r.identifier for r in records])
+        self.assertEqual([1000, 1001], [r.stamp for r in records])
+        self.assertEqual([{'one'}, set()], [r.sets for r in records])
+        self.assertEqual([{'A'}, {'A', 'B'}], [r.prefixes for r in records])
+        self.assertEqual([set(), {'B'}], [r.deletedPrefixes for r in records])
+        self.assertEqual([False, True], [r.isDeleted for r in records])
+        jazz.close()
+
+    def testOaiSelectReadsDocValues(self):
+        jazz = OaiJazz(self.tmpdir2("b"), deleteInSets=True)
+        jazz.addOaiRecord('id:1', metadataPrefixes=['A', 'B'], setSpecs=['one', 'two'])
+        jazz.deleteOaiRecordInSets('id:1', setSpecs=['two'])
+        jazz.deleteOaiRecordInPrefixes('id:1', metadataPrefixes=['B'])
+        jazz.addOaiRecord('id:2', metadataPrefixes=['A'])
+        jazz.commit()
+        jazz.addOaiRecord('id:3', metadataPrefixes=['A'])
+        list(compose(jazz.delete('id:3')))
+        records = list(jazz.oaiSelect(prefix='A', sets=None).records)
+        self.assertEqual([jazzModule.DocValuesRecord] * 3, [type(r) for r in records])
+        self.assertEqual(['id:1', 'id:2', 'id:3'], [r.identifier for r in records])
+        self.assertEqual([r.stamp for r in records], sorted(r.stamp for r in records))
+        self.assertEqual([{'A', 'B'}, {'A'}, {'A'}], [r.prefixes for r in records])
+        self.assertEqual([{'B'}, set(), {'A'}], [r.deletedPrefixes for r in records])
+        self.assertEqual([{'one', 'two'}, set(), set()], [r.sets for r in records])
+        self.assertEqual([{'two'}, set(), set()], [r.deletedSets for r in records])
+        self.assertEqual([False, False, True], [r.isDeleted for r in records])
+        self.assertEqual([True], [r.isDeleted for r in jazz.oaiSelect(prefix='A', sets=['two']).records])
+        jazz.close()
+
     def addDocuments(self, size):
         for id in range(1,size+1):
             self._addRecord(id)
@@ -698,6 +856,21 @@ class OaiJazzTest(SeecrTestCase):
         self.assertEqual(record4.stamp, oaiSelectResult.continueAfter)
         self.assertEqual(0, oaiSelectResult.recordsRemaining)
 
+    def testRecordsRemainingWithSets(self):
+        for i in range(1, 21):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['even' if i % 2 == 0 else 'odd'])
+        result = self.jazz.oaiSelect(prefix='prefix', sets=['even'], batchSize=3, shouldCountHits=True)
+        self.assertEqual(['id:2', 'id:4', 'id:6'], recordIds(result))
+        self.assertEqual(7, result.recordsRemaining)
+        result = self.jazz.oaiSelect(prefix='prefix', sets=['even'], continueAfter=str(result.continueAfter), batchSize=3, shouldCountHits=True)
+        self.assertEqual(['id:8', 'id:10', 'id:12'], recordIds(result))
+        self.assertEqual(4, result.recordsRemaining)
+        result = self.jazz.oaiSelect(prefix='prefix', sets=['even', 'odd'], batchSize=3, shouldCountHits=True)
+        self.assertEqual(['id:1', 'id:2', 'id:3'], recordIds(result))
+        self.assertEqual(17, result.recordsRemaining)
+        result = self.jazz.oaiSelect(prefix='prefix', setsMask=['odd'], batchSize=3, shouldCountHits=True)
+        self.assertEqual(7, result.recordsRemaining)
+
     def testAddOaiRecordWithNoMetadataFormats(self):
         self.jazz.updateSet(setSpec="setSpec", setName="setName")
         try:
@@ -823,6 +996,25 @@ class OaiJazzTest(SeecrTestCase):
             sorted(self.jazz.getAllSets(includeSetNames=True)),
         )
 
+    def testGenerationChangesWithSetsFormatsAndPurges(self):
+        self.assertEqual(0, self.jazz.getGeneration())
+        self.jazz.updateMetadataFormat(prefix="oai_dc", schema="schema", namespace="namespace")
+        generation = self.jazz.getGeneration()
+        self.assertTrue(generation > 0)
+        self.jazz.updateMetadataFormat(prefix="oai_dc", schema="schema", namespace="namespace")
+        self.jazz.updateSet(setSpec="aSet", setName="")
+        self.assertTrue(self.jazz.getGeneration() > generation)
+        generation = self.jazz.getGeneration()
+        self.jazz.updateSet(setSpec="aSet", setName="")
+        self.jazz.addOaiRecord('id:1', metadataPrefixes=['oai_dc'], setSpecs=['aSet'])
+        self.assertEqual(generation, self.jazz.getGeneration())
+        self.jazz.purge('id:1')
+        self.assertTrue(self.jazz.getGeneration() > generation)
+        generation = self.jazz.getGeneration()
+        self.jazz.close()
+        self.jazz = OaiJazz(join(self.tempdir, "a"))
+        self.assertEqual(generation, self.jazz.getGeneration())
+
     def testAddOaiRecordPrefixOnly(self):
         self.jazz.updateMetadataFormat(prefix="prefix", schema="schema", namespace="namespace")
         self.jazz.addOaiRecord(identifier='oai://1234?34', setSpecs=[], metadataPrefixes=['prefix'])
@@ -893,11 +1085,13 @@ class OaiJazzTest(SeecrTestCase):
 
         doc = Document()
         doc.add(StringField("identifier", "5", Field.Store.YES))
+        doc.add(BinaryDocValuesField("identifier", BytesRef("5")))
         stamp = int(1215320643123455)
         doc.add(LongPoint("stamp", stamp))
         doc.add(StoredField("stamp", stamp))
         doc.add(NumericDocValuesField("numeric_stamp", stamp))
         doc.add(StringField("prefix", "oai_dc", Field.Store.YES))
+        doc.add(SortedSetDocValuesField("prefix", BytesRef("oai_dc")))
         self.jazz._writer.updateDocument(Term("identifier", "5"), doc)
         self.jazz._latestModifications.add(str("5"))
 
@@ -980,6 +1174,37 @@ class OaiJazzTest(SeecrTestCase):
         self.jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
         self.assertEqual(['id:2', 'id:1'], recordIds(self.jazz.oaiSelect(prefix='prefix', continueAfter=continueAfter)))
 
+    def testOaiSelectWithContinueAfterOverSegments(self):
+        stamps = []
+        for i in range(1, 31):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'] if i % 3 else ['other'])
+            stamps.append(self.jazz.getRecord('id:%s' % i).stamp)
+            if i % 10 == 0:
+                self.jazz.commit()
+        expected = ['id:%s' % i for i in range(1, 31) if i % 3]
+        self.assertEqual(expected, recordIds(self.jazz.oaiSelect(prefix='prefix', batchSize=100)))
+        for continueAfter in [stamps[0], stamps[8], stamps[9], stamps[10], stamps[28], stamps[29]]:
+            result = self.jazz.oaiSelect(prefix='prefix', continueAfter=str(continueAfter), batchSize=5, shouldCountHits=True)
+            remaining = [i for i in expected if self.jazz.getRecord(i).stamp > continueAfter]
+            self.assertEqual(remaining[:5], recordIds(result))
+            self.assertEqual(max(0, len(remaining) - 5), result.recordsRemaining)
+        self.assertEqual({'total': 6, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='prefix', continueAfter=str(stamps[19])))
+
+    def testOaiSelectSkipsSegmentsWithoutPrefix(self):
+        for i in range(1, 16):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['other'] if 5 < i <= 10 else ['prefix'])
+            if i % 5 == 0:
+                self.jazz.commit()
+        self.assertTrue(SegmentStamps.cacheSize() > 0)
+        expected = ['id:%s' % i for i in list(range(1, 6)) + list(range(11, 16))]
+        self.assertEqual(expected, recordIds(self.jazz.oaiSelect(prefix='prefix', batchSize=100)))
+        result = self.jazz.oaiSelect(prefix='prefix', batchSize=5, shouldCountHits=True)
+        self.assertEqual(expected[:5], recordIds(result))
+        self.assertEqual(5, result.recordsRemaining)
+        self.assertEqual(expected[5:], recordIds(self.jazz.oaiSelect(prefix='prefix', continueAfter=result.continueAfter)))
+        self.assertEqual(['id:%s' % i for i in range(6, 11)], recordIds(self.jazz.oaiSelect(prefix='other')))
+        self.assertEqual({'total': 10, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='prefix'))
+
     def testGetAllMetadataFormats(self):
         self.jazz.updateMetadataFormat(prefix="prefix", schema="schema", namespace="namespace")
         self.jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
@@ -1102,6 +1327,53 @@ class OaiJazzTest(SeecrTestCase):
         self.assertEqual(['signalOaiUpdate'], self.observer.calledMethodNames())
         self.assertEqual({'metadataPrefixes': set(['prefix']), 'sets': set(), 'stamp':self.originalStampNumber+1}, self.observer.calledMethods[0].kwargs)
 
+    def testAddOaiRecords(self):
+        self.jazz.addOaiRecord('id:0', metadataPrefixes=['A'], setSpecs=['one'])
+        self.observer.calledMethods.reset()
+        self.jazz.addOaiRecords([
+                dict(identifier='id:1', metadataPrefixes=['A']),
+                dict(identifier='id:0', metadataPrefixes=['B'], setSpecs=['two']),
+                dict(identifier='id:2', metadataPrefixes=['A', 'B'], setSpecs=['one:two']),
+            ])
+        records = list(self.jazz.oaiSelect(prefix=None).records)
+        self.assertEqual(['id:1', 'id:0', 'id:2'], [r.identifier for r in records])
+        self.assertEqual([self.originalStampNumber + i for i in range(1, 4)], [r.stamp for r in records])
+        self.assertEqual({'A', 'B'}, self.jazz.getRecord('id:0').prefixes)
+        self.assertEqual({'one', 'two'}, self.jazz.getRecord('id:0').sets)
+        self.assertEqual(['signalOaiUpdate'], self.observer.calledMethodNames())
+        self.assertEqual({'metadataPrefixes': {'A', 'B'}, 'sets': {'one', 'two', 'one:two'}, 'stamp': self.originalStampNumber + 3}, self.observer.calledMethods[0].kwargs)
+
+    def testAddOaiRecordsInBatches(self):
+        self.jazz.addOaiRecords((dict(identifier='id:%s' % i, metadataPrefixes=['A']) for i in range(5)), batchSize=2)
+        self.assertEqual(['id:%s' % i for i in range(5)], recordIds(self.jazz.oaiSelect(prefix='A')))
+        self.assertEqual(['signalOaiUpdate'] * 3, self.observer.calledMethodNames())
+
+    def testAddOaiRecordsWithSameIdentifierInBatch(self):
+        self.jazz.addOaiRecords([
+                dict(identifier='id:1', metadataPrefixes=['A'], setSpecs=['one']),
+                dict(identifier='id:2', metadataPrefixes=['A']),
+                dict(identifier='id:1', metadataPrefixes=['B']),
+            ])
+        self.assertEqual(['id:1', 'id:2'], recordIds(self.jazz.oaiSelect(prefix='A')))
+        record = self.jazz.getRecord('id:1')
+        self.assertEqual(({'A', 'B'}, {'one'}), (record.prefixes, record.sets))
+        self.assertEqual(self.originalStampNumber + 2, record.stamp)
+
+    def testAddOaiRecordsValidates(self):
+        self.assertRaises(ValueError, lambda: self.jazz.addOaiRecords([dict(identifier='', metadataPrefixes=['A'])]))
+        self.assertRaises(ValueError, lambda: self.jazz.addOaiRecords([dict(identifier='id:1')]))
+        self.assertEqual([], recordIds(self.jazz.oaiSelect(prefix=None)))
+
+    def testDeleteOaiRecords(self):
+        self.jazz.addOaiRecords([dict(identifier='id:%s' % i, metadataPrefixes=['A']) for i in range(3)])
+        self.observer.calledMethods.reset()
+        self.jazz.deleteOaiRecords(['id:0', 'id:2', 'unknown'])
+        records = list(self.jazz.oaiSelect(prefix='A').records)
+        self.assertEqual([('id:1', False), ('id:0', True), ('id:2', True)], [(r.identifier, r.isDeleted) for r in records])
+        self.assertEqual(None, self.jazz.getRecord('unknown'))
+        self.assertEqual(records[-1].stamp, self.jazz._newestStamp)
+        self.assertEqual(['signalOaiUpdate'], self.observer.calledMethodNames())
+
 
     def testOaiSelectIsAlwaysSortedOnStamp(self):
         self.jazz = OaiJazz(join(self.tempdir, "b"))
@@ -1161,6 +1433,18 @@ class OaiJazzTest(SeecrTestCase):
         print([r.identifier for r in records[:10]])
         # print [str(r.stamp) for r in records]
 
+    def testTuningProfile(self):
+        jazz = OaiJazz(self.tmpdir2('b'), tuningProfile='ingest')
+        config = jazz._writer.getConfig()
+        self.assertEqual(256.0, config.getRAMBufferSizeMB())
+        self.assertEqual(20, LogByteSizeMergePolicy.cast_(config.getMergePolicy()).getMergeFactor())
+        self.assertEqual(3, ConcurrentMergeScheduler.cast_(config.getMergeScheduler()).getMaxThreadCount())
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        self.assertEqual(['id:1'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        jazz.close()
+        self.assertEqual(16.0, self.jazz._writer.getConfig().getRAMBufferSizeMB())
+        self.assertRaises(ValueError, lambda: OaiJazz(self.tmpdir2('c'), tuningProfile='fast'))
+
     def testReaderClosed(self):
         self.jazz.updateMetadataFormat(prefix="prefix", schema="schema", namespace="namespace")
         for i in range(1000):
@@ -1177,6 +1461,110 @@ class OaiJazzTest(SeecrTestCase):
         nfiles1 = len(listdir(self.jazz._directory))
         self.assertEqual(nfiles0, nfiles1)
 
+    def testLookupsDoNotReopenReader(self):
+        self.jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'], setSpecs=['one'])
+        self.jazz.oaiSelect(prefix='prefix')
+        reader = self.jazz._reader
+        self.jazz.addOaiRecord('id:1', metadataPrefixes=['other'])
+        self.jazz.addOaiRecord('id:2', metadataPrefixes=['prefix'])
+        self.assertEqual({'prefix', 'other'}, self.jazz.getRecord('id:1').prefixes)
+        self.assertEqual({'one'}, self.jazz.getRecord('id:1').sets)
+        self.assertEqual(self.originalStampNumber + 1, self.jazz.getRecord('id:1').stamp)
+        self.assertEqual('id:2', self.jazz.getRecord('id:2').identifier)
+        list(compose(self.jazz.delete('id:2')))
+        self.assertTrue(self.jazz.getRecord('id:2').isDeleted)
+        self.assertTrue(reader is self.jazz._reader)
+        self.assertEqual(['id:1', 'id:2'], recordIds(self.jazz.oaiSelect(prefix='prefix')))
+        self.assertFalse(reader is self.jazz._reader)
+        self.assertEqual({}, self.jazz._pendingDocuments)
+
+    def testPurgedRecordInPendingDocuments(self):
+        jazz = OaiJazz(self.tmpdir2('b'), persistentDelete=False)
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        jazz.oaiSelect(prefix='prefix')
+        jazz.purge('id:1')
+        self.assertEqual(None, jazz.getRecord('id:1'))
+        self.assertEqual({'id:1': None}, jazz._pendingDocuments)
+        jazz.close()
+
+    def testReopenAfterMaxPendingDocuments(self):
+        jazz = OaiJazz(self.tmpdir2('b'), maxPendingDocuments=3)
+        reader = jazz._reader
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        jazz.addOaiRecord('id:2', metadataPrefixes=['prefix'])
+        self.assertTrue(reader is jazz._reader)
+        self.assertEqual(2, len(jazz._pendingDocuments))
+        jazz.addOaiRecord('id:3', metadataPrefixes=['prefix'])
+        self.assertFalse(reader is jazz._reader)
+        self.assertEqual(0, len(jazz._pendingDocuments))
+        self.assertEqual('id:3', jazz.getRecord('id:3').identifier)
+        jazz.close()
+
+    def testReopenAfterReopenInterval(self):
+        jazz = OaiJazz(self.tmpdir2('b'), reopenInterval=0.1)
+        reader = jazz._reader
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        self.assertTrue(reader is jazz._reader)
+        sleep(0.15)
+        jazz.addOaiRecord('id:2', metadataPrefixes=['prefix'])
+        self.assertFalse(reader is jazz._reader)
+        jazz.close()
+
+    def testSearcherNotReopenedWithinMaxSearcherStaleness(self):
+        jazz = OaiJazz(self.tmpdir2('b'), maxSearcherStaleness=60)
+        reader = jazz._reader
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        self.assertEqual([], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertTrue(reader is jazz._reader)
+        self.assertEqual('id:1', jazz.getRecord('id:1').identifier)
+        self.assertEqual(['id:1'], list(jazz._pendingDocuments.keys()))
+        jazz.close()
+
+    def testOaiSelectUsesOneSearcher(self):
+        searchers = []
+        class RecordingOaiJazz(OaiJazz):
+            def _getSearcher(self):
+                searchers.append(OaiJazz._getSearcher(self))
+                return searchers[-1]
+        jazz = RecordingOaiJazz(self.tmpdir2('b'))
+        for i in range(5):
+            jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'])
+        del searchers[:]
+        result = jazz.oaiSelect(prefix='prefix', batchSize=2, shouldCountHits=True)
+        self.assertEqual(['id:0', 'id:1'], recordIds(result))
+        self.assertEqual(3, result.recordsRemaining)
+        self.assertEqual(1, len(searchers))
+        jazz.close()
+
+    def testSearcherRefreshedInBackground(self):
+        jazz = OaiJazz(self.tmpdir2('b'), maxSearcherStaleness=0.05)
+        reader = jazz._reader
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        jazz.addOaiRecord('id:2', metadataPrefixes=['prefix'])
+        sleep(0.2)
+        self.assertEqual(['id:1', 'id:2'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertFalse(reader is jazz._reader)
+        self.assertEqual({}, jazz._pendingDocuments)
+        self.assertEqual(set(), jazz._latestModifications)
+        jazz.addOaiRecord('id:1', metadataPrefixes=['other'])
+        self.assertEqual({'prefix', 'other'}, jazz.getRecord('id:1').prefixes)
+        jazz.close()
+
+    def testNewSegmentsWarmedBeforeSearch(self):
+        jazz = OaiJazz(self.tmpdir2('b'), warmSegments=False)
+        cacheSize = TermBitSets.cacheSize()
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        self.assertEqual(['id:1'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual(cacheSize, TermBitSets.cacheSize())
+        jazz.close()
+
+        jazz = OaiJazz(self.tmpdir2('c'))
+        cacheSize = TermBitSets.cacheSize()
+        jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        self.assertEqual(['id:1'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual(cacheSize + 1, TermBitSets.cacheSize())
+        jazz.close()
+
     @stdout_replaced
     def testJazzWithShutdown(self):
         self.jazz.updateMetadataFormat(prefix="prefix", schema="schema", namespace="namespace")
@@ -1228,6 +1616,61 @@ class OaiJazzTest(SeecrTestCase):
                     prefix='prefix',
                     partition=partition)))
 
+    def testSearchThreads(self):
+        jazz = OaiJazz(self.tmpdir2('b'), searchThreads=4)
+        plain = OaiJazz(self.tmpdir2('c'))
+        for i in range(60):
+            for j in [jazz, plain]:
+                j.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['set%s' % (i % 3)])
+                if i % 5 == 4:
+                    j.commit()
+                    j.oaiSelect(prefix='prefix')
+        self.assertTrue(len(jazz._getSearcher().getIndexReader().leaves()) > 5)
+        for kwargs in [
+                dict(prefix='prefix'),
+                dict(prefix='prefix', batchSize=7, shouldCountHits=True),
+                dict(prefix='prefix', sets=['set1', 'set2'], batchSize=7, shouldCountHits=True),
+                dict(prefix='prefix', sets=['set1'], batchSize=100),
+            ]:
+            expected = plain.oaiSelect(**kwargs)
+            result = jazz.oaiSelect(**kwargs)
+            self.assertEqual(recordIds(expected), recordIds(result))
+            self.assertEqual(expected.moreRecordsAvailable, result.moreRecordsAvailable)
+            self.assertEqual(getattr(expected, 'recordsRemaining', None), getattr(result, 'recordsRemaining', None))
+        result = jazz.oaiSelect(prefix='prefix', batchSize=7)
+        result = jazz.oaiSelect(prefix='prefix', batchSize=7, continueAfter=str(result.continueAfter))
+        self.assertEqual(['id:%s' % i for i in range(7, 14)], recordIds(result))
+        partition = CallTrace(returnValues=dict(ranges=[(0, 512)]))
+        self.assertEqual(plain.getNrOfRecords(prefix='prefix', partition=partition), jazz.getNrOfRecords(prefix='prefix', partition=partition))
+        self.assertEqual(plain.getNrOfRecords(prefix='prefix', setSpec='set2', oaiFrom='2000-01-01T00:00:00Z'), jazz.getNrOfRecords(prefix='prefix', setSpec='set2', oaiFrom='2000-01-01T00:00:00Z'))
+        jazz.close()
+        plain.close()
+
+    def testIdentifierStamps(self):
+        jazz = OaiJazz(self.tmpdir2('b'), persistentDelete=False, identifierStamps=True)
+        for i in range(10):
+            jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'])
+        jazz.commit()
+        jazz.close()
+
+        jazz = OaiJazz(self.tmpdir2('b'), persistentDelete=False, identifierStamps=True)
+        self.assertEqual(10, jazz._identifierStamps.size())
+        stamp = jazz.getRecord('id:3').stamp
+        self.assertEqual(stamp, jazz._identifierStamps.stamp('id:3'))
+        self.assertEqual(None, jazz.getRecord('id:unknown'))
+        self.assertEqual(-1, jazz._identifierStamps.stamp('id:unknown'))
+
+        jazz.addOaiRecord('id:3', metadataPrefixes=['other'])
+        self.assertEqual(['other', 'prefix'], sorted(jazz.getRecord('id:3').prefixes))
+        self.assertNotEqual(stamp, jazz._identifierStamps.stamp('id:3'))
+        jazz.purge('id:4')
+        self.assertEqual(None, jazz.getRecord('id:4'))
+        jazz.addOaiRecords([dict(identifier='id:5', metadataPrefixes=['other'], setSpecs=[]), dict(identifier='id:new', metadataPrefixes=['prefix'], setSpecs=[])])
+        self.assertEqual(['other', 'prefix'], sorted(jazz.getRecord('id:5').prefixes))
+        self.assertEqual(['id:0', 'id:1', 'id:2', 'id:6', 'id:7', 'id:8', 'id:9', 'id:3', 'id:5', 'id:new'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual(11, jazz._identifierStamps.size())
+        jazz.close()
+
     def testOaiWithDeleteInSetsSupport(self):
         jazz = OaiJazz(join(self.tempdir, 'b'), deleteInSets=True)
         for i in ['id:1', 'id:2', 'id:3', 'id:4']:
@@ -49,9 +49,10 @@ from meresco.components.http.utils import parseResponse, CRLF
 from meresco.oai.oairepository import OaiRepository
 from meresco.sequentialstore import MultiSequentialStorage
 
-from meresco.oai.oailist import OaiList
+from meresco.oai.oailist import OaiList, _PageCache
 from meresco.oai import OaiJazz
 from meresco.oai.oairecord import OaiRecord
+from meresco.oai.compression import GzipMember
 from meresco.xml.namespaces import namespaces
 
 from meresco.oaicommon import ResumptionToken
@@ -445,6 +446,122 @@ class OaiListTest(SeecrTestCase):
                 'oaiRecord'
             ], self.observer.calledMethodNames())
 
+    def testRetrieveMultipleDataAsynchronously(self):
+        self._addRecords(['id%s' % i for i in range(5)])
+        self.oaiList = OaiList(batchSize=10, dataBatchSize=2, repository=OaiRepository(), asyncDataFetch=True)
+        self.oaiList.addObserver(self.observer)
+        def retrieveMultipleData(identifiers, **kwargs):
+            yield Yield
+            return [(id, '<data id="%s"/>' % id) for id in identifiers]
+        self.observer.methods['retrieveMultipleData'] = retrieveMultipleData
+        def oaiRecord(record, metadataPrefix, fetchedRecords=None):
+            yield fetchedRecords[record.identifier]
+        self.observer.methods['oaiRecord'] = oaiRecord
+
+        result = list(compose(self.oaiList.listRecords(arguments=dict(verb=['ListRecords'], metadataPrefix=['oai_dc']), **self.httpkwargs)))
+        self.assertEqual(3, result.count(Yield))
+        body = ''.join(s for s in result if not s is Yield).split(CRLF*2,1)[-1]
+        oai = parse(BytesIO(body.encode()))
+        self.assertEqual(['id0', 'id1', 'id2', 'id3', 'id4'], xpath(oai, '//oai:ListRecords/oai:data/@id'))
+        self.assertEqual([['id0', 'id1'], ['id2', 'id3'], ['id4']], self.getMultipleDataIdentifiers)
+        self.assertEqual(['isKnownPrefix',
+                'oaiSelect',
+                'oaiWatermark',
+                'getMultipleData',
+                'retrieveMultipleData',
+                'oaiRecord',
+                'oaiRecord',
+                'getMultipleData',
+                'retrieveMultipleData',
+                'oaiRecord',
+                'oaiRecord',
+                'getMultipleData',
+                'retrieveMultipleData',
+                'oaiRecord',
+            ], self.observer.calledMethodNames())
+
+    def testFragmentCache(self):
+        self._addRecords(['id%s' % i for i in range(3)])
+        self.oaiList = OaiList(batchSize=10, repository=OaiRepository(), fragmentCacheSize=10000)
+        self.oaiList.addObserver(self.observer)
+        def getMultipleData(identifiers, **kwargs):
+            identifiers = list(identifiers)
+            self.getMultipleDataIdentifiers.append(identifiers)
+            return [(id, '<data id="%s"/>' % id) for id in identifiers]
+        self.observer.methods['getMultipleData'] = getMultipleData
+        def oaiRecord(record, metadataPrefix, fetchedRecords=None):
+            yield '<record>'
+            yield fetchedRecords[record.identifier]
+            yield '</record>'
+        self.observer.methods['oaiRecord'] = oaiRecord
+        listRecords = lambda: list(compose(self.oaiList.listRecords(arguments=dict(verb=['ListRecords'], metadataPrefix=['oai_dc']), **self.httpkwargs)))
+
+        result = listRecords()
+        self.assertEqual([['id0', 'id1', 'id2']], self.getMultipleDataIdentifiers)
+        fragments = [s for s in result if type(s) is GzipMember]
+        self.assertEqual(['<record><data id="id%s"/></record>' % i for i in range(3)], fragments)
+
+        self.oaiJazz.addOaiRecord(identifier='id1', metadataPrefixes=['oai_dc'])
+        result = listRecords()
+        self.assertEqual([['id0', 'id1', 'id2'], ['id1']], self.getMultipleDataIdentifiers)
+        self.assertEqual(fragments[:1] + fragments[2:] + fragments[1:2], [s for s in result if type(s) is GzipMember])
+        self.assertEqual(['oaiRecord', 'oaiRecord', 'oaiRecord', 'oaiRecord'], [m.name for m in self.observer.calledMethods if m.name == 'oaiRecord'])
+
+    def testPageCache(self):
+        self._addRecords(['id%s' % i for i in range(5)])
+        self.oaiList = OaiList(batchSize=2, repository=OaiRepository(), pageCacheSize=100000)
+        self.oaiList.addObserver(self.observer)
+        def listRecords(**arguments):
+            arguments['verb'] = ['ListRecords']
+            body = asString(self.oaiList.listRecords(arguments=arguments, **self.httpkwargs)).split(CRLF*2)[-1]
+            oai = parse(BytesIO(body.encode()))
+            return xpath(oai, '//mock:record/text()'), xpathFirst(oai, '//oai:resumptionToken/text()')
+        records, token = listRecords(metadataPrefix=['oai_dc'])
+        self.assertEqual(['id0/oai_dc', 'id1/oai_dc'], records)
+        self.assertEqual(['id2/oai_dc', 'id3/oai_dc'], listRecords(resumptionToken=[token])[0])
+        self.assertEqual(4, len([m for m in self.observer.calledMethods if m.name == 'oaiRecord']))
+
+        self.observer.calledMethods.reset()
+        self.assertEqual((records, token), listRecords(metadataPrefix=['oai_dc']))
+        self.assertEqual(['id2/oai_dc', 'id3/oai_dc'], listRecords(resumptionToken=[token])[0])
+        self.assertEqual([], [m for m in self.observer.calledMethods if m.name in ['oaiRecord', 'getMultipleData']])
+
+        self.oaiJazz.addOaiRecord(identifier='id3', metadataPrefixes=['oai_dc'])
+        self.assertEqual((records, token), listRecords(metadataPrefix=['oai_dc']))
+        self.assertEqual(['id2/oai_dc', 'id4/oai_dc'], listRecords(resumptionToken=[token])[0])
+        self.assertEqual(2, len([m for m in self.observer.calledMethods if m.name == 'oaiRecord']))
+
+        self.observer.calledMethods.reset()
+        listRecords(metadataPrefix=['oai_dc'], **{'x-count': ['True']})
+        self.assertEqual(2, len([m for m in self.observer.calledMethods if m.name == 'oaiRecord']))
+
+    def testPageCacheBoundedByBytes(self):
+        cache = _PageCache(maxBytes=10)
+        cache.add('a', 'fingerprint a', 'aaaa')
+        cache.add('b', 'fingerprint b', 'bbbb')
+        self.assertEqual(('fingerprint a', 'aaaa'), cache.get('a'))
+        cache.add('c', 'fingerprint c', 'cccc')
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual(2, len(cache))
+        cache.add('d', 'fingerprint d', 'd' * 11)
+        self.assertEqual(None, cache.get('d'))
+        cache.add('a', 'fingerprint a', '\u00e9' * 5)
+        self.assertEqual(None, cache.get('c'))
+        self.assertEqual(('fingerprint a', '\u00e9' * 5), cache.get('a'))
+
+    def testRenderRecordsInChunks(self):
+        self._addRecords(['id%s' % i for i in range(5)])
+        self.oaiList = OaiList(batchSize=10, repository=OaiRepository(), renderChunkSize=2)
+        self.oaiList.addObserver(self.observer)
+        result = list(compose(self.oaiList.listRecords(arguments=dict(verb=['ListRecords'], metadataPrefix=['oai_dc']), **self.httpkwargs)))
+        chunks = [s for s in result if type(s) is bytes]
+        self.assertEqual(3, len(chunks))
+        self.assertEqual(2, chunks[0].count(b'<mock:record'))
+        self.assertEqual(1, chunks[-1].count(b'<mock:record'))
+        body = ''.join(s.decode() if type(s) is bytes else s for s in result).split(CRLF*2,1)[-1]
+        oai = parse(BytesIO(body.encode()))
+        self.assertEqual(['id%s/oai_dc' % i for i in range(5)], xpath(oai, '//oai:ListRecords/mock:record/text()'))
+
 
     def _addRecords(self, identifiers, sets=None):
         sets = [] if sets is None else sets
@@ -39,8 +39,10 @@ from io import BytesIO
 from lxml.etree import parse, XML
 from os.path import join
 from socket import gethostname
-from time import sleep
+from math import ceil
+from time import sleep, time
 from urllib.parse import urlencode
+from zlib import decompress, MAX_WBITS
 
 from meresco.core import Observable
 from meresco.components import lxmltostring, RetrieveToGetDataAdapter
@@ -49,7 +51,7 @@ from meresco.sequentialstore import MultiSequentialStorage
 from meresco.xml import namespaces
 
 from meresco.oai import OaiPmh, OaiJazz, OaiBranding, SuspendRegister
-from weightless.core import be, compose, asBytes
+from weightless.core import be, compose, asBytes, Yield
 
 
 namespaces = namespaces.copyUpdate({
@@ -427,6 +429,190 @@ class OaiPmhTest(_OaiPmhTest):
         OaiPmh(repositoryName="Repository", adminEmail="admin@example.org", repositoryIdentifier="repoId.cq2.org")
         OaiPmh(repositoryName="Repository", adminEmail="admin@example.org", repositoryIdentifier="a.aa")
 
+    def testCompressedResponse(self):
+        oaipmh = OaiPmh(repositoryName='The Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, supportCompression=True)
+        root = be((Observable(),
+            (oaipmh,
+                (self.jazz, ),
+                (RetrieveToGetDataAdapter(),
+                    (self.storage,)
+                )
+            )
+        ))
+        def request(**headers):
+            return asBytes(compose(root.all.handleRequest(
+                    RequestURI='http://example.org/oai?verb=ListRecords&metadataPrefix=oai_dc',
+                    Headers=headers,
+                    Client=('127.0.0.1', 1324),
+                    Method='GET',
+                    port=9000,
+                    arguments=dict(verb=['ListRecords'], metadataPrefix=['oai_dc']),
+                    path='/oai',
+                )))
+        plainHeader, plainBody = request().split(CRLF.encode()*2, 1)
+        self.assertFalse(b'Content-Encoding' in plainHeader)
+        header, body = request(**{'Accept-Encoding': 'deflate;q=0.5, gzip'}).split(CRLF.encode()*2, 1)
+        self.assertTrue(b'\r\nContent-Encoding: gzip\r\n' in header, header)
+        self.assertTrue(b'\r\nVary: Accept-Encoding' in header, header)
+        self.assertTrue(len(body) < len(plainBody))
+        records = xpath(XML(decompress(body, 16 + MAX_WBITS)), '/oai:OAI-PMH/oai:ListRecords/oai:record')
+        self.assertEqual(10, len(records))
+        header, body = request(**{'Accept-Encoding': 'gzip;q=0, deflate'}).split(CRLF.encode()*2, 1)
+        self.assertTrue(b'\r\nContent-Encoding: deflate\r\n' in header, header)
+        self.assertEqual(10, len(xpath(XML(decompress(body)), '/oai:OAI-PMH/oai:ListRecords/oai:record')))
+        header, body = request(**{'Accept-Encoding': 'identity'}).split(CRLF.encode()*2, 1)
+        self.assertFalse(b'Content-Encoding' in header)
+
+    def testAsyncDataFetch(self):
+        oaipmh = OaiPmh(repositoryName='The Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, asyncDataFetch=True)
+        storage = self.storage
+        class AsyncStorage(object):
+            def retrieveMultipleData(self, name, identifiers, ignoreMissing=False):
+                yield Yield
+                return storage.getMultipleData(name=name, identifiers=identifiers, ignoreMissing=ignoreMissing)
+        root = be((Observable(),
+            (oaipmh,
+                (self.jazz, ),
+                (AsyncStorage(),)
+            )
+        ))
+        result = list(compose(root.all.handleRequest(
+                RequestURI='http://example.org/oai?verb=ListRecords&metadataPrefix=oai_dc',
+                Headers={},
+                Client=('127.0.0.1', 1324),
+                Method='GET',
+                port=9000,
+                arguments=dict(verb=['ListRecords'], metadataPrefix=['oai_dc']),
+                path='/oai',
+            )))
+        self.assertTrue(Yield in result)
+        header, body = parseResponse(asBytes(r for r in result if r is not Yield))
+        records = xpath(XML(body), '/oai:OAI-PMH/oai:ListRecords/oai:record')
+        self.assertEqual(10, len(records))
+        self.assertEqual(['record:id:01'], xpath(records[1], 'oai:metadata/oai_dc:dc/dc:identifier/text()'))
+
+    def testRenderChunkSize(self):
+        oaipmh = OaiPmh(repositoryName='The Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, renderChunkSize=4)
+        root = be((Observable(),
+            (oaipmh,
+                (self.jazz, ),
+                (RetrieveToGetDataAdapter(),
+                    (self.storage,)
+                )
+            )
+        ))
+        result = list(compose(root.all.handleRequest(
+                RequestURI='http://example.org/oai?verb=ListIdentifiers&metadataPrefix=oai_dc',
+                Headers={},
+                Client=('127.0.0.1', 1324),
+                Method='GET',
+                port=9000,
+                arguments=dict(verb=['ListIdentifiers'], metadataPrefix=['oai_dc']),
+                path='/oai',
+            )))
+        self.assertEqual([4, 4, 2], [s.count(b'<header') for s in result if type(s) is bytes and b'<header' in s])
+        header, body = parseResponse(asBytes(result))
+        self.assertEqual(10, len(xpath(XML(body), '/oai:OAI-PMH/oai:ListIdentifiers/oai:header')))
+
+    def testHeaderCacheSize(self):
+        def listIdentifiers(oaipmh):
+            root = be((Observable(),
+                (oaipmh,
+                    (self.jazz, ),
+                    (RetrieveToGetDataAdapter(),
+                        (self.storage,)
+                    )
+                )
+            ))
+            return parseResponse(asBytes(compose(root.all.handleRequest(
+                    RequestURI='http://example.org/oai?verb=ListIdentifiers&metadataPrefix=oai_dc',
+                    Headers={},
+                    Client=('127.0.0.1', 1324),
+                    Method='GET',
+                    port=9000,
+                    arguments=dict(verb=['ListIdentifiers'], metadataPrefix=['oai_dc']),
+                    path='/oai',
+                ))))[1]
+        expected = xpath(XML(listIdentifiers(self.getOaiPmh())), '/oai:OAI-PMH/oai:ListIdentifiers/oai:header')
+        oaipmh = OaiPmh(repositoryName='The Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, headerCacheSize=20)
+        for i in range(2):
+            headers = xpath(XML(listIdentifiers(oaipmh)), '/oai:OAI-PMH/oai:ListIdentifiers/oai:header')
+            self.assertEqual([lxmltostring(h) for h in expected], [lxmltostring(h) for h in headers])
+
+    def testConditionalRequests(self):
+        oaipmh = OaiPmh(repositoryName='The Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, supportConditionalRequests=True)
+        root = be((Observable(),
+            (oaipmh,
+                (self.jazz, ),
+                (RetrieveToGetDataAdapter(),
+                    (self.storage,)
+                )
+            )
+        ))
+        def request(**headers):
+            return parseResponse(asBytes(compose(root.all.handleRequest(
+                    RequestURI='http://example.org/oai?verb=ListIdentifiers&metadataPrefix=oai_dc',
+                    Headers=headers,
+                    Client=('127.0.0.1', 1324),
+                    Method='GET',
+                    port=9000,
+                    arguments=dict(verb=['ListIdentifiers'], metadataPrefix=['oai_dc']),
+                    path='/oai',
+                ))))
+        header, body = request()
+        self.assertEqual('200', header['StatusCode'])
+        newestChange = max(self.jazz.getLastStampId(prefix=None), self.jazz.getGeneration())
+        if ceil(newestChange / 1000000.0) > time():
+            self.assertFalse('Last-Modified' in header['Headers'])
+            sleep(max(0, ceil(newestChange / 1000000.0) - time()))
+            header, body = request()
+        etag = header['Headers']['ETag']
+        lastModified = header['Headers']['Last-Modified']
+        self.assertTrue(etag.startswith('W/"'), etag)
+
+        header, body = request(**{'If-None-Match': etag})
+        self.assertEqual('304', header['StatusCode'])
+        self.assertEqual(etag, header['Headers']['ETag'])
+        self.assertFalse(body)
+        header, body = request(**{'If-Modified-Since': lastModified})
+        self.assertEqual('304', header['StatusCode'])
+        header, body = request(**{'If-None-Match': '"other", %s' % etag[2:]})
+        self.assertEqual('304', header['StatusCode'])
+
+        header, body = request(**{'If-None-Match': '"other"', 'If-Modified-Since': lastModified})
+        self.assertEqual('200', header['StatusCode'])
+
+        self.jazz.addOaiRecord('record:id:new', metadataPrefixes=['oai_dc'])
+        header, body = request(**{'If-Modified-Since': lastModified})
+        self.assertEqual('200', header['StatusCode'])
+        header, body = request(**{'If-None-Match': etag})
+        self.assertEqual('200', header['StatusCode'])
+        self.assertNotEqual(etag, header['Headers']['ETag'])
+        etag = header['Headers']['ETag']
+
+        self.jazz.updateSet(setSpec='setSpec5', setName='another name')
+        header, body = request(**{'If-None-Match': etag})
+        self.assertEqual('200', header['StatusCode'])
+        etag = header['Headers']['ETag']
+
+        oaipmh.updateRepositoryInfo(name='Another Repository Name')
+        header, body = request(**{'If-None-Match': etag})
+        self.assertEqual('200', header['StatusCode'])
+        etag = header['Headers']['ETag']
+
+        oaipmh = OaiPmh(repositoryName='Another Repository Name', adminEmail='admin@meresco.org', batchSize=BATCHSIZE, supportConditionalRequests=True, preciseDatestamp=True)
+        root = be((Observable(),
+            (oaipmh,
+                (self.jazz, ),
+                (RetrieveToGetDataAdapter(),
+                    (self.storage,)
+                )
+            )
+        ))
+        header, body = request(**{'If-None-Match': etag})
+        self.assertEqual('200', header['StatusCode'])
+        self.assertNotEqual(etag, header['Headers']['ETag'])
+
 
 class OaiPmhWithIdentifierTest(_OaiPmhTest):
     def setUp(self):
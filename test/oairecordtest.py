@@ -211,6 +211,16 @@ class OaiRecordTest(SeecrTestCase):
 </header>""", result)
         self.assertEqual([], [str(m) for m in self.observer.calledMethods])
 
+    def testHeaderCache(self):
+        self.setUpOaiRecord(headerCacheSize=2)
+        header = lambda record: ''.join(compose(self.oaiRecord.oaiRecordHeader(record=record)))
+        self.assertTrue('<setSpec>set0</setSpec>' in header(MockRecord('id', stamp=1)))
+        self.assertTrue('<setSpec>set0</setSpec>' in header(MockRecord('id', stamp=1, sets=[])))
+        self.assertFalse('<setSpec>' in header(MockRecord('id', stamp=2, sets=[])))
+        self.assertTrue('status="deleted"' in header(MockRecord('id', stamp=2, sets=[], deleted=True)))
+        self.assertEqual(2, len(self.oaiRecord._headerCache))
+        self.assertFalse('<setSpec>' in header(MockRecord('id', stamp=1, sets=[])))
+
     def testRecordWithRepositoryIdentifier(self):
         self.setUpOaiRecord(repository=OaiRepository(identifier='example.org'))
         result = ''.join(compose(self.oaiRecord.oaiRecord(record=MockRecord('id'), metadataPrefix='oai_dc', fetchedRecords=None)))
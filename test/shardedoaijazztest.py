@@ -0,0 +1,129 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from itertools import count
+from os.path import join
+
+from seecr.test import SeecrTestCase, CallTrace
+
+from weightless.core import consume
+from meresco.oaicommon import Partition
+
+from meresco.oai import ShardedOaiJazz
+
+
+class ShardedOaiJazzTest(SeecrTestCase):
+    def setUp(self):
+        SeecrTestCase.setUp(self)
+        self.directory = join(self.tempdir, 'jazz')
+        self.jazz = ShardedOaiJazz(self.directory, nrOfShards=3)
+        self.observer = CallTrace()
+        self.jazz.addObserver(self.observer)
+        self.jazz.updateMetadataFormat(prefix='prefix', schema='schema', namespace='namespace')
+        self.jazz.updateSet(setSpec='even', setName='Even')
+
+    def tearDown(self):
+        self.jazz.close()
+        SeecrTestCase.tearDown(self)
+
+    def testRecordsRoutedToShards(self):
+        for i in range(12):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['even'] if i % 2 == 0 else [])
+        for i, shard in enumerate(self.jazz._shards):
+            identifiers = [record.identifier for record in shard.oaiSelect(prefix='prefix').records]
+            self.assertTrue(len(identifiers) > 0)
+            self.assertTrue(all(Partition.hashId(identifier) % 3 == i for identifier in identifiers))
+        self.assertEqual('id:5', self.jazz.getRecord('id:5').identifier)
+        self.assertEqual(None, self.jazz.getRecord('id:12'))
+        self.assertEqual(12, len(self.observer.calledMethods))
+        self.assertEqual(['signalOaiUpdate'], list(set(self.observer.calledMethodNames())))
+
+    def testOaiSelectMergesShardsInStampOrder(self):
+        for i in range(12):
+            self.jazz.addOaiRecord('id:%s' % i, metadataPrefixes=['prefix'], setSpecs=['even'] if i % 2 == 0 else [])
+        self.jazz.addOaiRecord('id:0', metadataPrefixes=['prefix'])
+        result = self.jazz.oaiSelect(prefix='prefix', batchSize=5, shouldCountHits=True)
+        self.assertEqual(['id:1', 'id:2', 'id:3', 'id:4', 'id:5'], recordIds(result))
+        self.assertTrue(result.moreRecordsAvailable)
+        self.assertEqual(7, result.recordsRemaining)
+        stamps = [record.stamp for record in self.jazz.oaiSelect(prefix='prefix').records]
+        self.assertEqual(sorted(stamps), stamps)
+        self.assertEqual(12, len(set(stamps)))
+        result = self.jazz.oaiSelect(prefix='prefix', batchSize=5, continueAfter=str(result.continueAfter))
+        self.assertEqual(['id:6', 'id:7', 'id:8', 'id:9', 'id:10'], recordIds(result))
+        result = self.jazz.oaiSelect(prefix='prefix', batchSize=5, continueAfter=str(result.continueAfter))
+        self.assertEqual(['id:11', 'id:0'], recordIds(result))
+        self.assertFalse(result.moreRecordsAvailable)
+        self.assertEqual(['id:2', 'id:4', 'id:6', 'id:8', 'id:10', 'id:0'], recordIds(self.jazz.oaiSelect(prefix='prefix', sets=['even'])))
+        self.assertEqual({'total': 12, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual(stamps[-1], self.jazz.getLastStampId(prefix='prefix'))
+
+    def testConcurrentBulkWrites(self):
+        self.jazz.close()
+        self.jazz = ShardedOaiJazz(self.directory, nrOfShards=3, writeThreads=3)
+        self.jazz.addObserver(self.observer)
+        self.jazz.addOaiRecords(({'identifier': 'id:%s' % i, 'metadataPrefixes': ['prefix']} for i in range(100)), batchSize=10)
+        self.assertEqual({'total': 100, 'deletes': 0}, self.jazz.getNrOfRecords(prefix='prefix'))
+        stamps = [record.stamp for record in self.jazz.oaiSelect(prefix='prefix', batchSize=100).records]
+        self.assertEqual(100, len(set(stamps)))
+        signalStamps = [m.kwargs['stamp'] for m in self.observer.calledMethods]
+        self.assertEqual(sorted(signalStamps), signalStamps)
+        self.jazz.deleteOaiRecords(['id:%s' % i for i in range(10)])
+        self.assertEqual({'total': 100, 'deletes': 10}, self.jazz.getNrOfRecords(prefix='prefix'))
+
+    def testDelete(self):
+        self.jazz.addOaiRecord('id:1', metadataPrefixes=['prefix'])
+        consume(self.jazz.delete('id:1'))
+        self.assertTrue(self.jazz.getRecord('id:1').isDeleted)
+        self.assertEqual({'total': 1, 'deletes': 1}, self.jazz.getNrOfRecords(prefix='prefix'))
+
+    def testShardsSharePrefixesAndSets(self):
+        self.assertEqual({'prefix'}, self.jazz.getAllPrefixes())
+        self.assertEqual({('even', 'Even')}, self.jazz.getAllSets(includeSetNames=True))
+        self.assertTrue(all(shard.getAllSets() == {'even'} for shard in self.jazz._shards))
+
+    def testPrefixesAndSetsOfRecordsInOtherShards(self):
+        identifier = next(identifier for identifier in ('id:%s' % i for i in count()) if Partition.hashId(identifier) % 3 == 2)
+        self.jazz.addOaiRecord(identifier, metadataPrefixes=['other'], setSpecs=['a:b'])
+        self.assertFalse(self.jazz._shards[0].isKnownPrefix('other'))
+        self.assertTrue(self.jazz.isKnownPrefix('other'))
+        self.assertEqual({'prefix', 'other'}, self.jazz.getAllPrefixes())
+        self.assertEqual({('prefix', 'schema', 'namespace'), ('other', '', '')}, set(self.jazz.getAllMetadataFormats()))
+        self.assertEqual({'even', 'a', 'a:b'}, self.jazz.getAllSets())
+        self.assertEqual({('even', 'Even'), ('a', ''), ('a:b', '')}, self.jazz.getAllSets(includeSetNames=True))
+        self.jazz.updateSet(setSpec='a', setName='A')
+        self.assertEqual({('even', 'Even'), ('a', 'A'), ('a:b', '')}, self.jazz.getAllSets(includeSetNames=True))
+
+    def testMaxSearcherStalenessNotSupported(self):
+        self.assertRaises(ValueError, lambda: ShardedOaiJazz(join(self.tempdir, 'other'), nrOfShards=2, maxSearcherStaleness=1.0))
+
+    def testNumberOfShardsCannotChange(self):
+        self.jazz.close()
+        self.assertRaises(ValueError, lambda: ShardedOaiJazz(self.directory, nrOfShards=2))
+        self.jazz = ShardedOaiJazz(self.directory, nrOfShards=3)
+
+
+def recordIds(oaiSelectResult):
+    return [record.identifier for record in oaiSelectResult.records]
@@ -0,0 +1,128 @@
+## begin license ##
+#
+# "Meresco Oai" are components to build Oai repositories, based on
+# "Meresco Core" and "Meresco Components".
+#
+# Copyright (C) 2021 Seecr (Seek You Too B.V.) https://seecr.nl
+#
+# This file is part of "Meresco Oai"
+#
+# "Meresco Oai" is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# "Meresco Oai" is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with "Meresco Oai"; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+## end license ##
+
+from calendar import timegm
+from json import load
+from os.path import join, isdir
+
+from seecr.test import SeecrTestCase
+
+from meresco.oai import OaiJazz, TimeBucketedOaiJazz
+
+
+class TimeBucketedOaiJazzTest(SeecrTestCase):
+    def setUp(self):
+        SeecrTestCase.setUp(self)
+        self.directory = join(self.tempdir, 'jazz')
+
+    def testRecordsInBucketsPerMonth(self):
+        jazz = TimeBucketedOaiJazz(self.directory, importMode=True, persistentDelete=False)
+        jazz.updateMetadataFormat(prefix='prefix', schema='schema', namespace='namespace')
+        for i, month in enumerate([1, 1, 2, 2, 3, 3]):
+            jazz._updateOaiRecord(identifier='id:%s' % i, setSpecs=['set%s' % (i % 2)], metadataPrefixes=['prefix'], _overrideStamp=stampOf(2020, month, 10 + i))
+        self.assertEqual(['202001', '202002', '202003'], jazz.getBucketPeriods())
+        jazz.close()
+
+        jazz = TimeBucketedOaiJazz(self.directory, persistentDelete=False)
+        self.assertEqual(['202001', '202002', '202003'], jazz.getBucketPeriods())
+        self.assertEqual(['id:0', 'id:1', 'id:2', 'id:3', 'id:4', 'id:5'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        result = jazz.oaiSelect(prefix='prefix', batchSize=3)
+        self.assertEqual(['id:0', 'id:1', 'id:2'], recordIds(result))
+        self.assertTrue(result.moreRecordsAvailable)
+        result = jazz.oaiSelect(prefix='prefix', batchSize=3, continueAfter=str(result.continueAfter))
+        self.assertEqual(['id:3', 'id:4', 'id:5'], recordIds(result))
+        self.assertFalse(result.moreRecordsAvailable)
+        self.assertEqual(['id:2', 'id:3'], recordIds(jazz.oaiSelect(prefix='prefix', oaiFrom='2020-02-01T00:00:00Z', oaiUntil='2020-02-28T00:00:00Z')))
+        self.assertEqual(['id:1', 'id:3', 'id:5'], recordIds(jazz.oaiSelect(prefix='prefix', sets=['set1'])))
+
+        jazz.addOaiRecord('id:0', metadataPrefixes=['prefix'])
+        self.assertEqual(4, len(jazz.getBucketPeriods()))
+        self.assertEqual(['id:1', 'id:2', 'id:3', 'id:4', 'id:5', 'id:0'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual({'total': 6, 'deletes': 0}, jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual({'total': 6, 'deletes': 0}, jazz.getNrOfRecords(prefix='prefix', oaiFrom='2020-01-01T00:00:00Z'))
+
+        jazz.purge('id:1')
+        jazz.commit()
+        newestPeriod = jazz.getBucketPeriods()[-1]
+        self.assertEqual(['202002', '202003', newestPeriod], jazz.getBucketPeriods())
+        self.assertFalse(isdir(join(self.directory, 'buckets', '202001')))
+        self.assertEqual(['id:2', 'id:3', 'id:4', 'id:5', 'id:0'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        jazz.close()
+
+        jazz = TimeBucketedOaiJazz(self.directory, persistentDelete=False)
+        self.assertEqual(['id:2', 'id:3', 'id:4', 'id:5', 'id:0'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual({'total': 5, 'deletes': 0}, jazz.getNrOfRecords(prefix='prefix'))
+        self.assertEqual('id:0', jazz.getRecord('id:0').identifier)
+        jazz.close()
+
+    def testCountersSavedAfterDroppingBuckets(self):
+        jazz = TimeBucketedOaiJazz(self.directory, importMode=True)
+        for i, month in enumerate([1, 2]):
+            jazz._updateOaiRecord(identifier='id:%s' % i, setSpecs=[], metadataPrefixes=['prefix'], _overrideStamp=stampOf(2020, month, 10))
+        jazz._updateOaiRecord(identifier='id:0', setSpecs=[], metadataPrefixes=['prefix'], _overrideStamp=stampOf(2020, 3, 10))
+        jazz.commit()
+        self.assertEqual(['202002', '202003'], jazz.getBucketPeriods())
+        with open(join(self.directory, 'counters.json')) as fp:
+            self.assertEqual(jazz._commitGeneration(), load(fp)['generation'])
+        jazz.close()
+
+    def testUpdateAcrossRolloverNotVisibleTwice(self):
+        jazz = TimeBucketedOaiJazz(self.directory, importMode=True, maxPendingDocuments=1)
+        for i, month in enumerate([1, 2]):
+            jazz._updateOaiRecord(identifier='id:%s' % i, setSpecs=[], metadataPrefixes=['prefix'], _overrideStamp=stampOf(2020, month, 10))
+        jazz._updateOaiRecord(identifier='id:0', setSpecs=[], metadataPrefixes=['prefix'], _overrideStamp=stampOf(2020, 3, 10))
+        self.assertEqual({}, jazz._pendingDocuments)
+        self.assertEqual(['id:1', 'id:0'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        jazz.close()
+
+        jazz = TimeBucketedOaiJazz(self.directory, maxPendingDocuments=1)
+        jazz.addOaiRecords([{'identifier': 'id:1', 'metadataPrefixes': ['prefix']}, {'identifier': 'id:2', 'metadataPrefixes': ['prefix']}])
+        self.assertEqual({}, jazz._pendingDocuments)
+        self.assertEqual(['id:0', 'id:1', 'id:2'], recordIds(jazz.oaiSelect(prefix='prefix')))
+        self.assertEqual({'total': 3, 'deletes': 0}, jazz.getNrOfRecords(prefix='prefix'))
+        jazz.close()
+
+    def testIndexOfOaiJazzRefused(self):
+        jazz = OaiJazz(self.directory)
+        jazz.addOaiRecord('id:0', metadataPrefixes=['prefix'])
+        jazz.close()
+        self.assertRaises(ValueError, lambda: TimeBucketedOaiJazz(self.directory))
+
+    def testBucketPeriodCannotChange(self):
+        TimeBucketedOaiJazz(self.directory, bucketPeriod='day').close()
+        self.assertRaises(ValueError, lambda: TimeBucketedOaiJazz(self.directory))
+        jazz = TimeBucketedOaiJazz(self.directory, bucketPeriod='day')
+        self.assertEqual(1, len(jazz.getBucketPeriods()))
+        jazz.close()
+
+    def testUnknownBucketPeriod(self):
+        self.assertRaises(ValueError, lambda: TimeBucketedOaiJazz(self.directory, bucketPeriod='week'))
+
+
+def stampOf(year, month, day):
+    return timegm((year, month, day, 12, 0, 0, 0, 0, 0)) * 1000000
+
+def recordIds(oaiSelectResult):
+    return [record.identifier for record in oaiSelectResult.records]